@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from .calculator import format_date
+from .config import ThresholdConfig
+
+LOGGER = logging.getLogger("etl.artifact_cache")
+
+T = TypeVar("T")
+
+# Part of every key; bump it when a stage's output shape changes so older artifacts are not reused.
+ARTIFACT_SCHEMA_VERSION = 2
+
+
+def _digest(payload: Any) -> str:
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def thresholds_digest(thresholds: ThresholdConfig) -> str:
+    return _digest(asdict(thresholds))
+
+
+class ArtifactCache:
+    """
+    Content-addressed store of stage outputs under ``<directory>/<stage>/<key>.json``.
+
+    The directory holds at most ``max_disk_bytes``; the least recently used artifacts are
+    evicted first. A store that fails only costs the reuse, never the stage.
+    """
+
+    def __init__(self, directory: Path, *, max_disk_bytes: int = 256 * 1024 * 1024) -> None:
+        self.directory = Path(directory)
+        self.max_disk_bytes = max_disk_bytes
+
+    @staticmethod
+    def key(
+        stage: str,
+        *,
+        country: str,
+        fasin: str,
+        start_date,
+        end_date,
+        thresholds: ThresholdConfig,
+        inputs: Dict[str, str],
+    ) -> str:
+        return _digest(
+            {
+                "stage": stage,
+                "schema": ARTIFACT_SCHEMA_VERSION,
+                "country": country,
+                "fasin": fasin,
+                "start_date": format_date(start_date),
+                "end_date": format_date(end_date),
+                "thresholds": thresholds_digest(thresholds),
+                "inputs": inputs,
+            }
+        )
+
+    def _path(self, stage: str, key: str) -> Path:
+        return self.directory / stage / f"{key}.json"
+
+    def load(self, stage: str, key: str) -> Optional[Any]:
+        path = self._path(stage, key)
+        try:
+            with path.open("r", encoding="utf-8") as handle:
+                payload = json.load(handle)[stage]
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(path)  # mtime doubles as the LRU clock for eviction
+        except OSError:
+            pass
+        return payload
+
+    def store(self, stage: str, key: str, payload: Any) -> Optional[Path]:
+        """Write one artifact; returns ``None`` when it could not be stored."""
+        path = self._path(stage, key)
+        # Runs computing the same key write their own temp file; the last rename wins.
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp_path.open("w", encoding="utf-8") as handle:
+                json.dump({stage: payload}, handle, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as exc:
+            LOGGER.warning("Could not store %s artifact %s: %s", stage, key[:12], exc)
+            return None
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self._enforce_disk_limit()
+        return path
+
+    def _enforce_disk_limit(self) -> None:
+        files = []
+        total = 0
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_disk_bytes:
+            return
+        for _, size, path in sorted(files):
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+
+class StageArtifacts:
+    """ArtifactCache bound to one parent, window and threshold set."""
+
+    def __init__(
+        self,
+        cache: ArtifactCache,
+        *,
+        country: str,
+        fasin: str,
+        start_date,
+        end_date,
+        thresholds: ThresholdConfig,
+        force: bool = False,
+    ) -> None:
+        self.cache = cache
+        self.country = country
+        self.fasin = fasin
+        self.start_date = start_date
+        self.end_date = end_date
+        self.thresholds = thresholds
+        self.force = force
+
+    def get_or_compute(self, stage: str, inputs: Dict[str, Optional[str]], compute: Callable[[], T]) -> T:
+        """
+        Return the cached artifact for ``stage`` or compute and store it.
+
+        ``inputs`` maps dataset names to content digests. An unknown digest (``None``,
+        e.g. a stream not read yet) disables caching for the call.
+        """
+        if any(digest is None for digest in inputs.values()):
+            return compute()
+        key = self.cache.key(
+            stage,
+            country=self.country,
+            fasin=self.fasin,
+            start_date=self.start_date,
+            end_date=self.end_date,
+            thresholds=self.thresholds,
+            inputs={name: str(digest) for name, digest in inputs.items()},
+        )
+        if not self.force:
+            cached = self.cache.load(stage, key)
+            if cached is not None:
+                LOGGER.info("Reusing cached %s artifact %s", stage, key[:12])
+                return cached
+        payload = compute()
+        self.cache.store(stage, key, payload)
+        return payload
@@ -1,10 +1,11 @@
 ﻿from __future__ import annotations
 
-from typing import Dict, Iterable, List
+from typing import Dict, List
 
 from .calculator import calc_rate, calc_share, format_date, round_float
 from .config import ThresholdConfig
-from .parent_summary import filter_snapshot, normalize_number
+from .metrics import instrument_stage
+from .parent_summary import SnapshotInput, resolve_snapshot_aggregate
 
 PROBLEM_CLASS_LABELS = {
     "A": "\u4e3b\u6218\u573a\u6b3e",
@@ -44,8 +45,9 @@ def _classify_asin(
     }
 
 
+@instrument_stage("asin_structure")
 def build_asin_structure(
-    rows: Iterable[Dict],
+    rows: SnapshotInput,
     *,
     country: str,
     fasin: str,
@@ -53,26 +55,18 @@ def build_asin_structure(
     end_date,
     parent_summary: Dict,
     thresholds: ThresholdConfig,
+    aggregated: bool = False,
 ) -> List[Dict]:
     start_fmt = format_date(start_date)
     end_fmt = format_date(end_date)
-    filtered_rows = list(
-        filter_snapshot(
-            rows,
-            country=country,
-            fasin=fasin,
-            start_date=start_fmt,
-            end_date=end_fmt,
-        )
-    )
-    grouped: Dict[str, Dict[str, float]] = {}
-    for row in filtered_rows:
-        asin = row.get("asin")
-        if not asin:
-            continue
-        asin_bucket = grouped.setdefault(asin, {"units_sold": 0.0, "units_returned": 0.0})
-        asin_bucket["units_sold"] += normalize_number(row.get("units_sold"))
-        asin_bucket["units_returned"] += normalize_number(row.get("units_returned"))
+    grouped = resolve_snapshot_aggregate(
+        rows,
+        country=country,
+        fasin=fasin,
+        start_date=start_fmt,
+        end_date=end_fmt,
+        aggregated=aggregated,
+    ).asin_totals
 
     total_units_sold = parent_summary.get("units_sold", 0) or 0
     total_units_returned = parent_summary.get("units_returned", 0) or 0
@@ -108,6 +102,8 @@ def build_asin_structure(
         }
         records.append(record)
 
+    # Ties are broken by ASIN so the order does not depend on how the rows were fetched.
+    records.sort(key=lambda item: item["asin"])
     records.sort(key=lambda item: (item["returns_share"], item["units_returned"]), reverse=True)
     top_n = thresholds.top_asin_rows
     if top_n > 0:
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Dict, Iterable, List, Union
+
+from .calculator import calc_rate, calc_share, format_date, parse_date, round_float
+from .metrics import instrument_stage
+from .snapshot_frame import SnapshotFrame
+
+
+@instrument_stage("asin_timeseries")
+def build_asin_timeseries(
+    rows: Union[Iterable[Dict], SnapshotFrame],
+    *,
+    country: str,
+    fasin: str,
+    start_date,
+    end_date,
+    window_days: int,
+) -> Dict:
+    """
+    Rolling ``window_days`` return rate and shares per child ASIN for every day of the window.
+
+    The point of day ``d`` covers ``[d - window_days + 1, d]``, so rows from before
+    ``start_date`` feed the first points when they are present. Daily units are binned once
+    and the rolling sums are slid forward by adding the new day and subtracting the day that
+    left the window. The result is columnar: one ``dates`` list and one list per metric.
+    """
+    if window_days <= 0:
+        raise ValueError(f"window_days must be positive: {window_days}")
+    frame = rows if isinstance(rows, SnapshotFrame) else SnapshotFrame.from_rows(rows, country=country, fasin=fasin)
+    if frame.aggregated:
+        raise ValueError("The ASIN time series needs daily snapshot rows")
+
+    start = parse_date(start_date)
+    end = parse_date(end_date)
+    first = start.toordinal() - window_days + 1
+    day_count = end.toordinal() - first + 1
+
+    sold_by_day: List[List[int]] = [[0] * day_count for _ in frame.asins]
+    returned_by_day: List[List[int]] = [[0] * day_count for _ in frame.asins]
+    present = [False] * len(frame.asins)
+    if frame.matches(country, fasin):
+        for idx, code in enumerate(frame.asin_codes):
+            day = frame.date_ordinals[idx] - first
+            if 0 <= day < day_count:
+                sold_by_day[code][day] += frame.units_sold[idx]
+                returned_by_day[code][day] += frame.units_returned[idx]
+                present[code] = True
+    present_codes = [code for code in range(len(frame.asins)) if present[code]]
+    # Rows without an ASIN only feed the parent totals, as in parent_summary.
+    codes = [code for code in present_codes if frame.asins[code]]
+
+    parent_sold = [sum(sold_by_day[code][day] for code in present_codes) for day in range(day_count)]
+    parent_returned = [sum(returned_by_day[code][day] for code in present_codes) for day in range(day_count)]
+
+    def rolling(daily: List[int]) -> List[int]:
+        window_sums: List[int] = []
+        running = 0
+        for day, value in enumerate(daily):
+            running += value
+            if day >= window_days:
+                running -= daily[day - window_days]
+            if day >= window_days - 1:
+                window_sums.append(running)
+        return window_sums
+
+    rolling_parent_sold = rolling(parent_sold)
+    rolling_parent_returned = rolling(parent_returned)
+
+    series: List[Dict] = []
+    for code in codes:
+        sold = rolling(sold_by_day[code])
+        returned = rolling(returned_by_day[code])
+        series.append(
+            {
+                "asin": frame.asins[code],
+                "units_sold": sold,
+                "units_returned": returned,
+                "return_rate": [round_float(calc_rate(r, s)) for s, r in zip(sold, returned)],
+                "sales_share": [round_float(calc_share(s, total)) for s, total in zip(sold, rolling_parent_sold)],
+                "returns_share": [
+                    round_float(calc_share(r, total)) for r, total in zip(returned, rolling_parent_returned)
+                ],
+            }
+        )
+    # Largest contributors first; ties are broken by ASIN like asin_structure.
+    series.sort(key=lambda item: item["asin"])
+    series.sort(key=lambda item: (sum(item["units_returned"]), sum(item["units_sold"])), reverse=True)
+
+    return {
+        "country": country,
+        "fasin": fasin,
+        "start_date": format_date(start),
+        "end_date": format_date(end),
+        "window_days": window_days,
+        "dates": [format_date(start + timedelta(days=offset)) for offset in range(len(rolling_parent_sold))],
+        "parent": {
+            "units_sold": rolling_parent_sold,
+            "units_returned": rolling_parent_returned,
+            "return_rate": [
+                round_float(calc_rate(r, s)) for s, r in zip(rolling_parent_sold, rolling_parent_returned)
+            ],
+        },
+        "asins": series,
+    }
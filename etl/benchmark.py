@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import platform
+import statistics
+from dataclasses import replace
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from .calculator import format_date, parse_date
+from .config import ThresholdConfig
+from .fact_index import FactIndex
+from .metrics import collect_events, peak_rss_bytes
+from .pipeline import compute_parent_outputs, compute_snapshot_stages
+from .problem_reasons import build_problem_reasons
+from .reason_explanations import build_reason_explanations
+from .snapshot_frame import np
+from .synthetic_data import SyntheticSpec, generate_datasets
+
+LOGGER = logging.getLogger("etl.benchmark")
+
+# Reported in pipeline order; snapshot_aggregate is the shared 4.1/4.2 snapshot pass and
+# fact_index the shared (asin, tag_code) index read by 4.3 and the explanations.
+BENCHMARK_STAGES = (
+    "snapshot_aggregate",
+    "parent_summary",
+    "asin_structure",
+    "fact_index",
+    "problem_asin_reasons",
+    "reason_explanations",
+)
+DEFAULT_TOLERANCE = 0.25
+# Differences below this are timer noise, whatever the ratio says (parent_summary takes microseconds).
+MIN_SIGNIFICANT_SECONDS = 0.005
+# Evidence cap used when checking the sampled explanations for parity.
+PARITY_EVIDENCE_CAP = 5
+# Small, sparse parents where equally frequent tags are common, so tie-breaks get exercised.
+PARITY_SEEDS = 40
+PARITY_SPARSE_SHAPE = {"asins": 50, "reviews": 400}
+
+
+def output_digest(payload: Any) -> str:
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def benchmark_stages(
+    datasets: Dict[str, List[Dict[str, Any]]],
+    spec: SyntheticSpec,
+    *,
+    thresholds: ThresholdConfig,
+    repeat: int = 3,
+) -> Dict[str, Any]:
+    """
+    Time the compute stages on in-memory datasets ``repeat`` times.
+
+    Each round runs ``compute_parent_outputs`` exactly as a pipeline run would and reads the
+    per-stage wall/CPU times from the metrics events; outputs are digested so a baseline can
+    tell a speed-up from a changed result.
+    """
+    timings: Dict[str, Dict[str, List[float]]] = {
+        stage: {"wall_seconds": [], "cpu_seconds": []} for stage in BENCHMARK_STAGES
+    }
+    rows: Dict[str, Dict[str, Optional[int]]] = {}
+    outputs: Dict[str, Any] = {}
+    pipeline_logger = logging.getLogger("etl.pipeline")
+    previous_level = pipeline_logger.level
+    pipeline_logger.setLevel(max(previous_level, logging.WARNING))
+    try:
+        for round_index in range(max(repeat, 1)):
+            outputs, events = collect_events(
+                compute_parent_outputs,
+                snapshot_rows=datasets["view_return_snapshot"],
+                fact_rows=datasets["view_return_fact_details"],
+                tag_dim=datasets["return_dim_tag"],
+                thresholds=thresholds,
+                country=spec.country,
+                fasin=spec.fasin,
+                start_date=spec.start_date,
+                end_date=spec.end_date,
+            )
+            for event in events:
+                if event.get("kind") != "stage" or event["name"] not in timings:
+                    continue
+                timings[event["name"]]["wall_seconds"].append(event["wall_seconds"])
+                timings[event["name"]]["cpu_seconds"].append(event["cpu_seconds"])
+                rows[event["name"]] = {"rows_in": event.get("rows_in"), "rows_out": event.get("rows_out")}
+            LOGGER.info(
+                "Round %d: %s",
+                round_index + 1,
+                ", ".join(f"{stage}={timings[stage]['wall_seconds'][-1]:.3f}s" for stage in BENCHMARK_STAGES),
+            )
+    finally:
+        pipeline_logger.setLevel(previous_level)
+
+    stages: Dict[str, Dict[str, Any]] = {}
+    for stage in BENCHMARK_STAGES:
+        walls = timings[stage]["wall_seconds"]
+        stages[stage] = {
+            "wall_seconds_min": min(walls),
+            "wall_seconds_median": round(statistics.median(walls), 6),
+            "cpu_seconds_median": round(statistics.median(timings[stage]["cpu_seconds"]), 6),
+            **rows.get(stage, {}),
+        }
+        if stage in outputs:
+            stages[stage]["digest"] = output_digest(outputs[stage])
+    return {
+        "spec": spec.to_dict(),
+        "repeat": max(repeat, 1),
+        "python": platform.python_version(),
+        "numpy": np is not None,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "stages": stages,
+    }
+
+
+def check_fact_index_parity(
+    datasets: Dict[str, List[Dict[str, Any]]],
+    spec: SyntheticSpec,
+    *,
+    thresholds: ThresholdConfig,
+) -> Dict[str, bool]:
+    """
+    Whether 4.3 and the explanations give the same output over a plain row stream (the
+    ``--stream`` path) and over a ``FactIndex`` (the default path).
+
+    Checked on the full window and on its second half, so rows outside the window come
+    before rows inside it as they do in real runs; any ``False`` is a bug in the index path.
+    """
+    fact_rows = datasets["view_return_fact_details"]
+    index = FactIndex.from_rows(fact_rows)
+    midpoint = parse_date(spec.start_date) + timedelta(days=spec.days // 2)
+    parity: Dict[str, bool] = {}
+    for label, start_date in (("full", spec.start_date), ("half", format_date(midpoint))):
+        window = dict(country=spec.country, fasin=spec.fasin, start_date=start_date, end_date=spec.end_date)
+        _, asin_structure = compute_snapshot_stages(
+            snapshot_rows=datasets["view_return_snapshot"], thresholds=thresholds, **window
+        )
+        reasons = {
+            name: build_problem_reasons(
+                asin_structure=asin_structure,
+                fact_rows=rows,
+                tag_dimension=datasets["return_dim_tag"],
+                thresholds=thresholds,
+                **window,
+            )
+            for name, rows in (("rows", iter(fact_rows)), ("index", index))
+        }
+        parity[f"problem_asin_reasons_{label}"] = reasons["rows"] == reasons["index"]
+        for cap in (0, PARITY_EVIDENCE_CAP):
+            explanations = [
+                build_reason_explanations(problem_reasons=reasons["rows"], fact_rows=rows, max_evidence_per_reason=cap)
+                for rows in (iter(fact_rows), index)
+            ]
+            name = "reason_explanations" if not cap else f"reason_explanations_top{cap}"
+            parity[f"{name}_{label}"] = explanations[0] == explanations[1]
+    return parity
+
+
+def fact_index_parity_report(
+    datasets: Dict[str, List[Dict[str, Any]]],
+    spec: SyntheticSpec,
+    *,
+    thresholds: ThresholdConfig,
+) -> Dict[str, Any]:
+    """``check_fact_index_parity`` on the benchmark data and on ``PARITY_SEEDS`` sparse parents."""
+    mismatches: List[Dict[str, Any]] = []
+    checks = [(spec, datasets)]
+    checks.extend(
+        (sparse, generate_datasets(sparse))
+        for sparse in (
+            replace(spec, seed=spec.seed + offset, **PARITY_SPARSE_SHAPE) for offset in range(PARITY_SEEDS)
+        )
+    )
+    for checked_spec, checked_datasets in checks:
+        parity = check_fact_index_parity(checked_datasets, checked_spec, thresholds=thresholds)
+        failed = [name for name, same in parity.items() if not same]
+        if failed:
+            mismatches.append({"spec": checked_spec.to_dict(), "checks": failed})
+    return {"checked_specs": len(checks), "mismatches": mismatches, "ok": not mismatches}
+
+
+def compare_with_baseline(
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+    *,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> Dict[str, Any]:
+    """
+    Per-stage verdicts against a stored baseline report of the same spec.
+
+    A stage is ``changed`` when its output digest differs, ``regression`` when its median wall
+    time exceeds the baseline by more than ``tolerance`` and ``improvement`` when it is faster
+    by more than that; differences under ``MIN_SIGNIFICANT_SECONDS`` are never flagged.
+    """
+    if baseline.get("spec") != report["spec"]:
+        raise ValueError(
+            "Baseline was recorded for a different synthetic spec; rerun with --save-baseline "
+            f"(baseline {baseline.get('spec')}, current {report['spec']})"
+        )
+    verdicts: Dict[str, Dict[str, Any]] = {}
+    for stage, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous is None:
+            verdicts[stage] = {"status": "new"}
+            continue
+        base_wall = previous["wall_seconds_median"]
+        ratio = current["wall_seconds_median"] / base_wall if base_wall else 1.0
+        significant = abs(current["wall_seconds_median"] - base_wall) >= MIN_SIGNIFICANT_SECONDS
+        if previous.get("digest") and current.get("digest") and previous["digest"] != current["digest"]:
+            status = "changed"
+        elif significant and ratio > 1 + tolerance:
+            status = "regression"
+        elif significant and ratio < 1 - tolerance:
+            status = "improvement"
+        else:
+            status = "ok"
+        verdicts[stage] = {
+            "status": status,
+            "baseline_wall_seconds_median": base_wall,
+            "ratio": round(ratio, 3),
+        }
+    return {
+        "tolerance": tolerance,
+        "stages": verdicts,
+        "ok": all(verdict["status"] not in {"changed", "regression"} for verdict in verdicts.values()),
+    }
@@ -2,14 +2,24 @@ from __future__ import annotations
 
 import argparse
 import json
+from contextlib import contextmanager
 from datetime import date, timedelta
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Iterator, Optional, Tuple
 
+from .artifact_cache import ArtifactCache, StageArtifacts
 from .calculator import format_date, resolve_window
 from .config import BASE_DIR, PipelineConfig, build_config
+from .data_source import SOURCE_HELP
+from .dataset_io import DATASET_FORMATS
+from .doris_client import DorisClient
+from .metrics import MetricsRecorder, run_metrics
+from .profiling import run_profile
+from .reason_explanations import EXPLANATION_LAYOUTS
+from .synthetic_data import SYNTHETIC_SCALES, SyntheticSpec, synthetic_spec
 
 DEFAULT_PARAMS_PATH = BASE_DIR / "config" / "run_params.json"
+SNAPSHOT_MODES = ("aggregated", "daily", "incremental")
 
 
 def build_stage_parser(description: str) -> argparse.ArgumentParser:
@@ -20,6 +30,84 @@ def build_stage_parser(description: str) -> argparse.ArgumentParser:
     parser.add_argument("--window-days", type=int, help="Analysis window length in days")
     parser.add_argument("--start-date", help="Override window start date (YYYY-MM-DD)")
     parser.add_argument("--end-date", help="Override window end date (YYYY-MM-DD)")
+    parser.add_argument(
+        "--snapshot-mode",
+        choices=SNAPSHOT_MODES,
+        default="aggregated",
+        help=(
+            "Fetch per-ASIN totals aggregated in Doris (default), raw daily snapshot rows, "
+            "or daily rows served from the incrementally synced local snapshot store"
+        ),
+    )
+    parser.add_argument(
+        "--lookback-days",
+        type=int,
+        help="Synced days re-fetched in incremental mode to pick up late corrections",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream fact rows through an unbuffered cursor instead of loading them all in memory",
+    )
+    parser.add_argument(
+        "--two-phase-facts",
+        action="store_true",
+        help="Fetch tag assignments first and review text only for the selected core reasons",
+    )
+    parser.add_argument(
+        "--max-evidence",
+        type=int,
+        help="Keep at most this many fact rows per core reason in reason_explanations (0 keeps all)",
+    )
+    parser.add_argument(
+        "--query-cache",
+        action="store_true",
+        help="Cache Doris query results in memory and on disk (per-table TTL, LRU eviction)",
+    )
+    parser.add_argument("--cache-dir", help="Query cache directory (defaults to <data_dir>/query_cache)")
+    parser.add_argument(
+        "--stale-while-revalidate",
+        action="store_true",
+        help="Serve expired cache entries and refresh them in the background",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Recompute every stage instead of reusing cached upstream artifacts",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=DATASET_FORMATS,
+        help="Layout of input dumps and stage outputs: pretty json (default), compact json or ndjson",
+    )
+    parser.add_argument("--gzip", action="store_true", help="Gzip input dumps and stage outputs")
+    parser.add_argument(
+        "--partitioned-output",
+        action="store_true",
+        help=(
+            "Write outputs atomically under <output_dir>/country=/fasin=/window= and record "
+            "each artifact in <output_dir>/manifest.ndjson"
+        ),
+    )
+    parser.add_argument(
+        "--explanation-layout",
+        choices=EXPLANATION_LAYOUTS,
+        help=(
+            "Write reason_explanations as fetched rows (default) or normalized into "
+            "reason_explanation_reviews + reason_explanation_edges"
+        ),
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Record per-query/stage/write timings into <output_dir>/run_metrics.json and run_metrics.prom",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile every stage with cProfile and tracemalloc into <output_dir>/profile",
+    )
+    parser.add_argument("--source", help=SOURCE_HELP)
     parser.add_argument("--data-dir", help="Optional override for template/input directory")
     parser.add_argument("--output-dir", help="Optional override for template/output directory")
     parser.add_argument("--env-file", help="Environment config file (YAML)")
@@ -32,6 +120,35 @@ def build_stage_parser(description: str) -> argparse.ArgumentParser:
     return parser
 
 
+def add_synthetic_arguments(parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser.add_argument(
+        "--scale",
+        choices=tuple(SYNTHETIC_SCALES),
+        default="small",
+        help=", ".join(
+            f"{name}: {shape['asins']} ASINs x {shape['days']} days, {shape['reviews']} reviews"
+            for name, shape in SYNTHETIC_SCALES.items()
+        ),
+    )
+    parser.add_argument("--asins", type=int, help="Override the number of child ASINs")
+    parser.add_argument("--days", type=int, help="Override the number of snapshot days")
+    parser.add_argument("--reviews", type=int, help="Override the number of tagged reviews")
+    parser.add_argument("--tags", type=int, help="Override the number of tags in return_dim_tag")
+    parser.add_argument("--seed", type=int, help="Random seed (same seed and sizes give identical data)")
+    return parser
+
+
+def resolve_synthetic_spec(args: argparse.Namespace) -> SyntheticSpec:
+    return synthetic_spec(
+        args.scale,
+        asins=args.asins,
+        days=args.days,
+        reviews=args.reviews,
+        tags=args.tags,
+        seed=args.seed,
+    )
+
+
 def _load_params(path: Path) -> Dict[str, Any]:
     if not path.exists():
         return {}
@@ -50,22 +167,50 @@ def _coerce_int(value: Any) -> int | None:
         return None
 
 
-def resolve_runtime(args: argparse.Namespace) -> Tuple[PipelineConfig, date, date]:
+def resolve_runtime(
+    args: argparse.Namespace,
+    *,
+    require_target: bool = True,
+) -> Tuple[PipelineConfig, date, date]:
     data_dir = Path(args.data_dir).resolve() if args.data_dir else None
     output_dir = Path(args.output_dir).resolve() if args.output_dir else None
     env_file = Path(args.env_file).resolve() if args.env_file else None
     config = build_config(data_dir=data_dir, output_dir=output_dir, environment_path=env_file)
 
+    config.cache.enabled = bool(args.query_cache)
+    config.cache.stale_while_revalidate = bool(args.stale_while_revalidate)
+    if args.cache_dir:
+        config.cache.directory = Path(args.cache_dir).resolve()
+    if args.source:
+        config.source = args.source
+    if args.output_format:
+        config.paths.dataset_format = args.output_format
+    config.paths.compress = bool(args.gzip)
+    config.paths.partitioned_output = bool(args.partitioned_output)
+    if args.explanation_layout:
+        config.paths.explanation_layout = args.explanation_layout
+
     params_path = Path(args.params_file).resolve() if args.params_file else DEFAULT_PARAMS_PATH
     params = _load_params(params_path)
 
     args.country = args.country or params.get("country")
     args.fasin = args.fasin or params.get("fasin")
-    if not args.country or not args.fasin:
+    if require_target and (not args.country or not args.fasin):
         raise ValueError("country and fasin must be provided either via CLI arguments or params file")
 
     resolved_window_days = args.window_days or _coerce_int(params.get("window_days")) or config.default_window_days
     args.window_days = resolved_window_days
+    lookback_days = args.lookback_days
+    if lookback_days is None:
+        lookback_days = _coerce_int(params.get("lookback_days"))
+    args.lookback_days = config.snapshot_lookback_days if lookback_days is None else lookback_days
+    max_evidence = args.max_evidence
+    if max_evidence is None:
+        max_evidence = _coerce_int(params.get("max_evidence_per_reason"))
+    if max_evidence is not None:
+        if max_evidence < 0:
+            raise ValueError("--max-evidence must be zero (keep all) or positive")
+        config.max_evidence_per_reason = max_evidence
 
     default_biz_date = date.today() - timedelta(days=1)
     biz_date_value = args.biz_date or params.get("biz_date") or default_biz_date
@@ -84,3 +229,49 @@ def resolve_runtime(args: argparse.Namespace) -> Tuple[PipelineConfig, date, dat
 def format_window(start_date: date, end_date: date) -> Tuple[str, str]:
     return format_date(start_date), format_date(end_date)
 
+
+def build_stage_artifacts(
+    args: argparse.Namespace,
+    config: PipelineConfig,
+    start_date: date,
+    end_date: date,
+) -> StageArtifacts:
+    return StageArtifacts(
+        ArtifactCache(config.paths.data_dir / "artifact_cache", max_disk_bytes=config.cache.max_artifact_bytes),
+        country=args.country,
+        fasin=args.fasin,
+        start_date=start_date,
+        end_date=end_date,
+        thresholds=config.thresholds,
+        force=bool(args.force),
+    )
+
+
+def collect_input_digests(client: DorisClient, args: argparse.Namespace) -> Dict[str, Optional[str]]:
+    """Content digests of the datasets fetched for this run; streamed facts are not known up front."""
+    fact_table = "view_return_fact_tags" if args.two_phase_facts else "view_return_fact_details"
+    return {
+        "snapshot": client.dataset_digests.get(DorisClient.SNAPSHOT_TABLES[args.snapshot_mode]),
+        "facts": None if args.stream else client.dataset_digests.get(fact_table),
+        "tags": client.dataset_digests.get("return_dim_tag"),
+    }
+
+
+@contextmanager
+def stage_instrumentation(
+    args: argparse.Namespace,
+    config: PipelineConfig,
+    entry_point: str,
+) -> Iterator[Optional[MetricsRecorder]]:
+    """
+    Run metrics (``--metrics``) and stage profiling (``--profile``) for one entry point,
+    tagged with country/fasin; a no-op when neither is given.
+    """
+    with run_metrics(
+        bool(args.metrics),
+        config.paths.output_dir,
+        entry_point=entry_point,
+        country=args.country,
+        fasin=args.fasin,
+    ) as recorder, run_profile(bool(args.profile), config.paths.output_dir, entry_point):
+        yield recorder
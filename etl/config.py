@@ -18,6 +18,7 @@ class DatabaseConfig:
     database: str = ""
     username: str = ""
     password: str = ""
+    pool_size: int = 3
 
 
 @dataclass
@@ -44,6 +45,36 @@ class ThresholdConfig:
 class PathConfig:
     data_dir: Path = DEFAULT_DATA_DIR
     output_dir: Path = DEFAULT_OUTPUT_DIR
+    # Layout of input dumps and stage outputs: json (pretty), compact or ndjson, optionally gzipped.
+    dataset_format: str = "json"
+    compress: bool = False
+    # reason_explanations as fetched rows, or normalized into review and edge tables.
+    explanation_layout: str = "rows"
+    # Write outputs under country=/fasin=/window= partitions indexed by manifest.ndjson.
+    partitioned_output: bool = False
+
+
+def _default_cache_ttls() -> Dict[str, int]:
+    # return_dim_tag only changes when a new tag version is published; facts are re-tagged often.
+    return {
+        "return_dim_tag": 24 * 3600,
+        "view_return_snapshot": 30 * 60,
+        "view_return_fact_details": 10 * 60,
+    }
+
+
+@dataclass
+class CacheConfig:
+    enabled: bool = False
+    directory: Optional[Path] = None
+    ttl_seconds: Dict[str, int] = field(default_factory=_default_cache_ttls)
+    default_ttl_seconds: int = 10 * 60
+    max_memory_entries: int = 64
+    max_disk_bytes: int = 512 * 1024 * 1024
+    # Upper bound of <data_dir>/artifact_cache, evicted least recently used first.
+    max_artifact_bytes: int = 256 * 1024 * 1024
+    stale_while_revalidate: bool = False
+    max_stale_seconds: int = 24 * 3600
 
 
 @dataclass
@@ -51,7 +82,13 @@ class PipelineConfig:
     database: DatabaseConfig = field(default_factory=DatabaseConfig)
     thresholds: ThresholdConfig = field(default_factory=ThresholdConfig)
     paths: PathConfig = field(default_factory=PathConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    source: str = "doris"
     default_window_days: int = 30
+    snapshot_lookback_days: int = 3
+    series_window_days: int = 7
+    # Fact rows kept per core reason in reason_explanations; 0 keeps them all.
+    max_evidence_per_reason: int = 0
 
 
 def _convert_value(raw: str) -> Any:
@@ -112,6 +149,7 @@ def load_database_config(environment_path: Optional[Path] = None) -> DatabaseCon
         database=str(doris_block.get("database", "") or ""),
         username=str(doris_block.get("username", "") or ""),
         password=str(doris_block.get("password", "") or ""),
+        pool_size=int(doris_block.get("pool_size", 3) or 3),
     )
 
 
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from .config import PipelineConfig
+from .doris_client import DorisClient
+
+SOURCE_HELP = "Data source: doris (default) or sqlite:<path> for a local file built by etl.run_sqlite_load"
+
+
+def create_client(config: PipelineConfig) -> DorisClient:
+    """Open the configured data source; every source exposes the DorisClient ``fetch_*`` interface."""
+    source = (config.source or "doris").strip()
+    if source == "doris":
+        return DorisClient(config.database, config.paths, config.cache)
+    if source.startswith("sqlite:"):
+        from .sqlite_client import SqliteClient
+
+        return SqliteClient(Path(source[len("sqlite:") :]).expanduser(), config.paths, config.cache, config.database)
+    raise ValueError(f"Unknown data source {source!r}; use doris or sqlite:<path>")
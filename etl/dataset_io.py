@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import textwrap
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+# json: pretty-printed (indent=2); compact: no whitespace; ndjson: one row per line.
+DATASET_FORMATS = ("json", "compact", "ndjson")
+GZIP_LEVEL = 6
+READ_CHUNK_CHARS = 1 << 16
+
+_COMPACT = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+def dataset_path(directory: Path, table_name: str, *, fmt: str = "json", compress: bool = False) -> Path:
+    suffix = ".ndjson" if fmt == "ndjson" else ".json"
+    return Path(directory) / f"{table_name}{suffix}{'.gz' if compress else ''}"
+
+
+def dataset_table_name(path: Path) -> str:
+    name = Path(path).name
+    for suffix in (".gz", ".ndjson", ".json"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    return name
+
+
+def _existing_datasets(directory: Path, table_name: str) -> List[Path]:
+    candidates = [
+        dataset_path(directory, table_name, fmt=fmt, compress=compress)
+        for fmt in ("json", "ndjson")
+        for compress in (False, True)
+    ]
+    return [path for path in candidates if path.exists()]
+
+
+def find_dataset(directory: Path, table_name: str) -> Optional[Path]:
+    """Newest dump of ``table_name`` in any format, or ``None``."""
+    existing = _existing_datasets(directory, table_name)
+    if not existing:
+        return None
+    return max(existing, key=lambda path: path.stat().st_mtime)
+
+
+def remove_dataset(directory: Path, table_name: str) -> List[Path]:
+    """Delete every dump of ``table_name`` in ``directory``, whatever its format; returns the removed paths."""
+    removed = _existing_datasets(directory, table_name)
+    for path in removed:
+        path.unlink()
+    return removed
+
+
+def open_dataset(path: Path, mode: str = "r") -> IO[str]:
+    """Open a dataset file as text; ``.gz`` files are (de)compressed transparently."""
+    path = Path(path)
+    encoding = "utf-8-sig" if mode == "r" else "utf-8"
+    if path.suffix == ".gz":
+        if mode == "r":
+            return gzip.open(path, "rt", encoding=encoding)
+        return gzip.open(path, f"{mode}t", encoding=encoding, compresslevel=GZIP_LEVEL)
+    return path.open(mode, encoding=encoding)
+
+
+def resolve_format(records: Any, fmt: str) -> str:
+    # Only row lists have lines to delimit; single objects (e.g. parent_summary) stay compact JSON.
+    if fmt == "ndjson" and not isinstance(records, list):
+        return "compact"
+    return fmt
+
+
+def write_records(handle: IO[str], table_name: str, records: Any, fmt: str) -> None:
+    """Write ``{table_name: records}``, or one line per row for NDJSON."""
+    if fmt == "ndjson":
+        for row in records:
+            handle.write(json.dumps(row, **_COMPACT))
+            handle.write("\n")
+    elif fmt == "compact":
+        handle.write(json.dumps({table_name: records}, **_COMPACT))
+    else:
+        json.dump({table_name: records}, handle, ensure_ascii=False, indent=2)
+
+
+class HashingWriter:
+    """File wrapper that hashes everything written so dumps get a content digest for free."""
+
+    def __init__(self, handle: Any) -> None:
+        self._handle = handle
+        self._hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, text: str) -> int:
+        encoded = text.encode("utf-8")
+        self._hasher.update(encoded)
+        self.size += len(encoded)
+        return self._handle.write(text)
+
+    def hexdigest(self) -> str:
+        return self._hasher.hexdigest()
+
+
+class RowWriter:
+    """Incremental writer for a list dataset, producing the same bytes as ``write_records``."""
+
+    def __init__(self, handle: IO[str], table_name: str, fmt: str) -> None:
+        self.handle = handle
+        self.table_name = table_name
+        self.fmt = fmt
+        self.count = 0
+        if fmt == "json":
+            handle.write(f'{{\n  "{table_name}": [')
+        elif fmt == "compact":
+            handle.write(json.dumps(table_name, ensure_ascii=False).join(("{", ":[")))
+
+    def write(self, row: Dict[str, Any]) -> None:
+        if self.fmt == "ndjson":
+            self.handle.write(json.dumps(row, **_COMPACT))
+            self.handle.write("\n")
+        elif self.fmt == "compact":
+            if self.count:
+                self.handle.write(",")
+            self.handle.write(json.dumps(row, **_COMPACT))
+        else:
+            self.handle.write(",\n" if self.count else "\n")
+            self.handle.write(textwrap.indent(json.dumps(row, ensure_ascii=False, indent=2), "    "))
+        self.count += 1
+
+    def close(self) -> None:
+        if self.fmt == "json":
+            self.handle.write("\n  ]\n}" if self.count else "]\n}")
+        elif self.fmt == "compact":
+            self.handle.write("]}")
+
+
+def load_dataset(path: Path) -> Any:
+    """
+    Read a dataset file in any format.
+
+    JSON files return the stored object (``{table_name: records}``); NDJSON files return
+    the ``{table_name: rows}`` they were written from.
+    """
+    path = Path(path)
+    with open_dataset(path) as handle:
+        if ".ndjson" not in path.name:
+            return json.load(handle)
+        rows: List[Any] = [json.loads(line) for line in handle if line.strip()]
+    return {dataset_table_name(path): rows}
+
+
+class _JsonScanner:
+    """Pull parser over a text handle that decodes one JSON value at a time from a sliding buffer."""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, handle: IO[str]) -> None:
+        self.handle = handle
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.handle.read(READ_CHUNK_CHARS)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it ('' at end of input)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n\ufeff":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON stream, found {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                result, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number or literal ending exactly at the buffer edge may continue in the next chunk.
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return result
+
+
+def _iter_array(scanner: _JsonScanner) -> Iterator[Any]:
+    scanner.expect("[")
+    if scanner.peek() == "]":
+        scanner.pos += 1
+        return
+    while True:
+        yield scanner.value()
+        if scanner.peek() == ",":
+            scanner.pos += 1
+            continue
+        scanner.expect("]")
+        return
+
+
+def iter_dataset_rows(path: Path, table_name: Optional[str] = None) -> Iterator[Any]:
+    """
+    Yield the rows of a list dataset one at a time, in any format.
+
+    JSON files may hold ``{table_name: [...]}`` (other keys are decoded and skipped) or a
+    bare array. Only one row and one read chunk are held in memory at a time.
+    """
+    path = Path(path)
+    table_name = table_name or dataset_table_name(path)
+    with open_dataset(path) as handle:
+        if ".ndjson" in path.name:
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        scanner = _JsonScanner(handle)
+        if scanner.peek() == "[":
+            yield from _iter_array(scanner)
+            return
+        scanner.expect("{")
+        while scanner.peek() not in ("}", ""):
+            key = scanner.value()
+            scanner.expect(":")
+            if key == table_name and scanner.peek() == "[":
+                yield from _iter_array(scanner)
+                return
+            scanner.value()
+            if scanner.peek() == ",":
+                scanner.pos += 1
+
+
+def write_dataset_file(
+    directory: Path,
+    table_name: str,
+    records: Any,
+    *,
+    fmt: str = "json",
+    compress: bool = False,
+) -> Path:
+    fmt = resolve_format(records, fmt)
+    path = dataset_path(directory, table_name, fmt=fmt, compress=compress)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open_dataset(path, "w") as handle:
+        write_records(handle, table_name, records, fmt)
+    return path
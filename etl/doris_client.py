@@ -1,15 +1,40 @@
 ﻿from __future__ import annotations
 
 import json
-from datetime import date, datetime
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from decimal import Decimal
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.cursors import DictCursor, SSDictCursor
 
-from .config import DatabaseConfig, PathConfig
+from .calculator import format_date, parse_date
+from .config import CacheConfig, DatabaseConfig, PathConfig
+from .dataset_io import (
+    HashingWriter,
+    RowWriter,
+    dataset_path,
+    open_dataset,
+    remove_dataset,
+    resolve_format,
+    write_records,
+)
+from .metrics import count_rows, measure
+from .output_store import OutputStore
+from .query_cache import QueryCache, sql_table_name
+
+LOGGER = logging.getLogger("etl.doris_client")
+
+
+def _approx_bytes(rows: List[Dict[str, Any]]) -> int:
+    # Text size of the fetched values; a cheap stand-in for the bytes received from the server.
+    return sum(len(str(value)) for row in rows for value in row.values() if value is not None)
 
 
 class DorisClient:
@@ -20,6 +45,13 @@ class DorisClient:
         "FROM view_return_snapshot "
         "WHERE country = %s AND fasin = %s AND snapshot_date BETWEEN %s AND %s"
     )
+    SNAPSHOT_AGG_SQL = (
+        "SELECT country, fasin, asin, SUM(units_sold) AS units_sold, "
+        "SUM(units_returned) AS units_returned "
+        "FROM view_return_snapshot "
+        "WHERE country = %s AND fasin = %s AND snapshot_date BETWEEN %s AND %s "
+        "GROUP BY country, fasin, asin"
+    )
     FACT_SQL = (
         "SELECT country, fasin, asin, review_id, review_source, review_date, tag_code, "
         "review_en, review_cn, sentiment, tag_name_cn, evidence, created_at, updated_at "
@@ -27,20 +59,86 @@ class DorisClient:
         "WHERE country = %s AND fasin = %s AND review_source IN (0, 1) "
         "AND review_date BETWEEN %s AND %s"
     )
+    FACT_TAG_SQL = (
+        "SELECT country, fasin, asin, review_id, review_source, review_date, tag_code, tag_name_cn "
+        "FROM view_return_fact_details "
+        "WHERE country = %s AND fasin = %s AND review_source IN (0, 1) "
+        "AND review_date BETWEEN %s AND %s"
+    )
+    FACT_TEXT_SQL = (
+        "SELECT country, fasin, asin, review_id, review_source, review_date, tag_code, "
+        "review_en, review_cn, sentiment, tag_name_cn, evidence, created_at, updated_at "
+        "FROM view_return_fact_details "
+        "WHERE country = %s AND fasin = %s AND review_source IN (0, 1) "
+        "AND review_date BETWEEN %s AND %s AND ({pair_filter})"
+    )
+    FACT_TEXT_PAIRS_PER_QUERY = 200
+    SNAPSHOT_BATCH_SQL = (
+        "SELECT country, fasin, asin, snapshot_date, units_sold, units_returned "
+        "FROM view_return_snapshot "
+        "WHERE country = %s AND fasin IN ({placeholders}) AND snapshot_date BETWEEN %s AND %s"
+    )
+    SNAPSHOT_AGG_BATCH_SQL = (
+        "SELECT country, fasin, asin, SUM(units_sold) AS units_sold, "
+        "SUM(units_returned) AS units_returned "
+        "FROM view_return_snapshot "
+        "WHERE country = %s AND fasin IN ({placeholders}) AND snapshot_date BETWEEN %s AND %s "
+        "GROUP BY country, fasin, asin"
+    )
+    FACT_BATCH_SQL = (
+        "SELECT country, fasin, asin, review_id, review_source, review_date, tag_code, "
+        "review_en, review_cn, sentiment, tag_name_cn, evidence, created_at, updated_at "
+        "FROM view_return_fact_details "
+        "WHERE country = %s AND fasin IN ({placeholders}) AND review_source IN (0, 1) "
+        "AND review_date BETWEEN %s AND %s"
+    )
     TAG_SQL = (
         "SELECT tag_code, tag_name_cn, category_code, category_name_cn, level, "
         "definition, boundary_note, is_active, version, effective_from, effective_to, "
         "created_at, updated_at "
         "FROM return_dim_tag"
     )
+    SNAPSHOT_TABLES = {
+        "aggregated": "view_return_snapshot_agg",
+        "daily": "view_return_snapshot",
+        "incremental": "view_return_snapshot",
+    }
 
-    def __init__(self, database: DatabaseConfig, paths: PathConfig) -> None:
+    def __init__(
+        self,
+        database: DatabaseConfig,
+        paths: PathConfig,
+        cache: Optional[CacheConfig] = None,
+    ) -> None:
         self.database = database
         self.data_dir = Path(paths.data_dir)
         self.output_dir = Path(paths.output_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self._connection: Optional[pymysql.connections.Connection] = None
+        self.dataset_format = paths.dataset_format
+        self.compress = paths.compress
+        self.output_store: Optional[OutputStore] = (
+            OutputStore(self.output_dir, fmt=self.dataset_format, compress=self.compress)
+            if paths.partitioned_output
+            else None
+        )
+        # Small LIFO pool; the semaphore caps concurrent checkouts (and so open connections).
+        self._idle_connections: "queue.LifoQueue[pymysql.connections.Connection]" = queue.LifoQueue()
+        self._pool_slots = threading.BoundedSemaphore(max(database.pool_size, 1))
+        self.cache: Optional[QueryCache] = None
+        if cache is not None and cache.enabled:
+            self.cache = QueryCache(
+                cache,
+                cache.directory or self.data_dir / "query_cache",
+                source=self.source_identity(),
+            )
+        self._revalidations: List[threading.Thread] = []
+        # sha256 of the last dump written per table, used to key stage artifacts.
+        self.dataset_digests: Dict[str, str] = {}
+
+    def source_identity(self) -> str:
+        """Where query results come from; keeps cached results of different servers apart."""
+        return f"doris://{self.database.host}:{self.database.port}/{self.database.database}"
 
     def __enter__(self) -> "DorisClient":
         return self
@@ -49,49 +147,146 @@ class DorisClient:
         self.close()
 
     def close(self) -> None:
-        if self._connection is not None:
-            self._connection.close()
-            self._connection = None
-
-    def _connect(self) -> pymysql.connections.Connection:
-        if self._connection is None:
-            self._connection = pymysql.connect(
-                host=self.database.host,
-                port=self.database.port,
-                user=self.database.username,
-                password=self.database.password,
-                database=self.database.database,
-                cursorclass=DictCursor,
-                charset="utf8mb4",
+        for thread in self._revalidations:
+            thread.join()
+        self._revalidations.clear()
+        if self.cache is not None:
+            LOGGER.info(
+                "Query cache: %d hits, %d stale hits, %d misses",
+                self.cache.hits,
+                self.cache.stale_hits,
+                self.cache.misses,
             )
-        return self._connection
+        while True:
+            try:
+                connection = self._idle_connections.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
 
-    def _execute_query(self, sql: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
-        connection = self._connect()
+    def _open_connection(self) -> pymysql.connections.Connection:
+        return pymysql.connect(
+            host=self.database.host,
+            port=self.database.port,
+            user=self.database.username,
+            password=self.database.password,
+            database=self.database.database,
+            cursorclass=DictCursor,
+            charset="utf8mb4",
+        )
+
+    @contextmanager
+    def _pooled_connection(self) -> Iterator[pymysql.connections.Connection]:
+        """Check a connection out of the pool; connections that raised are dropped, not reused."""
+        self._pool_slots.acquire()
+        try:
+            try:
+                connection = self._idle_connections.get_nowait()
+            except queue.Empty:
+                connection = self._open_connection()
+            try:
+                yield connection
+            except BaseException:
+                try:
+                    connection.close()
+                except Exception:  # noqa: BLE001 - already failing
+                    pass
+                raise
+            self._idle_connections.put(connection)
+        finally:
+            self._pool_slots.release()
+
+    def _query_rows(
+        self,
+        connection: pymysql.connections.Connection,
+        sql: str,
+        params: Sequence[Any],
+    ) -> List[Dict[str, Any]]:
         with connection.cursor() as cursor:
             cursor.execute(sql, params)
             rows = cursor.fetchall()
         return [self._normalize_row(row) for row in rows]
 
+    def _execute_query(self, sql: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+        with measure("query", sql_table_name(sql)) as event:
+            rows, source = self._cached_query(sql, params)
+            if event is not None:
+                event.update(source=source, rows_out=len(rows), bytes=_approx_bytes(rows))
+        return rows
+
+    def _cached_query(self, sql: str, params: Sequence[Any]) -> Tuple[List[Dict[str, Any]], str]:
+        if self.cache is None:
+            with self._pooled_connection() as connection:
+                return self._query_rows(connection, sql, params), "database"
+        cached = self.cache.get(sql, params)
+        if cached is not None:
+            rows, is_stale = cached
+            if is_stale:
+                self._schedule_revalidation(sql, params)
+            return rows, "stale_cache" if is_stale else "cache"
+        with self._pooled_connection() as connection:
+            rows = self._query_rows(connection, sql, params)
+        self.cache.put(sql, params, rows)
+        return rows, "database"
+
+    def _schedule_revalidation(self, sql: str, params: Sequence[Any]) -> None:
+        """Refresh a stale cache entry on a pooled connection while the stale rows are used."""
+
+        def revalidate() -> None:
+            try:
+                with self._pooled_connection() as connection:
+                    rows = self._query_rows(connection, sql, params)
+                if self.cache is not None:
+                    self.cache.put(sql, params, rows)
+            except Exception:  # noqa: BLE001 - the stale rows were already served
+                LOGGER.warning("Failed to revalidate cached query", exc_info=True)
+
+        thread = threading.Thread(target=revalidate, name="doris-cache-revalidate", daemon=True)
+        thread.start()
+        self._revalidations.append(thread)
+
+    def _iter_query(self, sql: str, params: Sequence[Any]) -> Iterator[Dict[str, Any]]:
+        """Stream rows through an unbuffered server-side cursor, normalizing them lazily."""
+        with self._pooled_connection() as connection:
+            cursor = connection.cursor(SSDictCursor)
+            try:
+                cursor.execute(sql, params)
+                for row in cursor:
+                    yield self._normalize_row(row)
+            finally:
+                cursor.close()
+
     @staticmethod
     def _normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
-        normalized: Dict[str, Any] = {}
+        # Normalize in place so each fetched row only exists once in memory.
         for key, value in row.items():
             if isinstance(value, (datetime, date)):
-                normalized[key] = value.isoformat()
+                row[key] = value.isoformat()
             elif isinstance(value, Decimal):
-                normalized[key] = float(value)
-            else:
-                normalized[key] = value
-        return normalized
+                row[key] = float(value)
+        return row
 
-    def _write_dataset(self, table_name: str, records: Any, directory: Optional[Path] = None) -> Path:
+    def _write_dataset(
+        self,
+        table_name: str,
+        records: Any,
+        directory: Optional[Path] = None,
+        *,
+        compact: bool = False,
+    ) -> Path:
         directory = directory or self.data_dir
         directory.mkdir(parents=True, exist_ok=True)
-        file_path = directory / f"{table_name}.json"
-        payload = {table_name: records}
-        with file_path.open("w", encoding="utf-8") as handle:
-            json.dump(payload, handle, ensure_ascii=False, indent=2)
+        fmt = "compact" if compact and self.dataset_format == "json" else self.dataset_format
+        fmt = resolve_format(records, fmt)
+        file_path = dataset_path(directory, table_name, fmt=fmt, compress=self.compress)
+        with measure("write", table_name, rows_in=count_rows(records)) as event:
+            with open_dataset(file_path, "w") as handle:
+                writer = HashingWriter(handle)
+                write_records(writer, table_name, records, fmt)
+            if event is not None:
+                # Serialized size before compression; the file itself may be smaller.
+                event["bytes"] = writer.size
+        self.dataset_digests[table_name] = writer.hexdigest()
         return file_path
 
     def fetch_view_return_snapshot(
@@ -106,6 +301,144 @@ class DorisClient:
         self._write_dataset("view_return_snapshot", rows)
         return rows
 
+    def _snapshot_store_path(self, country: str, fasin: str) -> Path:
+        return self.data_dir / "snapshot_store" / country / f"{fasin}.json"
+
+    @staticmethod
+    def _load_snapshot_store(path: Path) -> Dict[str, Any]:
+        if not path.exists():
+            return {}
+        try:
+            with path.open("r", encoding="utf-8") as handle:
+                store = json.load(handle)
+        except (OSError, ValueError) as exc:
+            # An unreadable store is rebuilt from Doris instead of blocking every later sync.
+            LOGGER.warning("Ignoring unreadable snapshot store %s, resyncing: %s", path, exc)
+            return {}
+        return store if isinstance(store, dict) else {}
+
+    @staticmethod
+    def _save_snapshot_store(path: Path, store: Dict[str, Any]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Concurrent syncs of one parent write their own temp file; the last rename wins.
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as handle:
+                json.dump(store, handle, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    def sync_view_return_snapshot(
+        self,
+        *,
+        country: str,
+        fasin: str,
+        start_date: str,
+        end_date: str,
+        lookback_days: int = 0,
+        dump_dir: Optional[Path] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Serve daily snapshot rows from a local per-parent store, fetching only missing days.
+
+        The store remembers the covered date range; each call fetches the days before
+        ``covered_from`` and after ``watermark``, the newest snapshot_date fetched so far
+        (re-reading the last ``lookback_days`` synced days to pick up late corrections), and
+        replaces those days in the store.
+        """
+        start = parse_date(start_date)
+        end = parse_date(end_date)
+        path = self._snapshot_store_path(country, fasin)
+        store = self._load_snapshot_store(path)
+        rows: List[Dict[str, Any]] = store.get("view_return_snapshot", [])
+
+        ranges: List[tuple[date, date]] = []
+        if not store.get("covered_from"):
+            ranges.append((start, end))
+            covered_from = start
+        else:
+            covered_from = parse_date(store["covered_from"])
+            # Days after the last snapshot_date actually seen may not have landed yet.
+            if store.get("watermark"):
+                watermark = parse_date(store["watermark"])
+            else:
+                watermark = covered_from - timedelta(days=1)
+            if start < covered_from:
+                ranges.append((start, covered_from - timedelta(days=1)))
+            if end > watermark:
+                refresh_from = watermark + timedelta(days=1) - timedelta(days=max(lookback_days, 0))
+                ranges.append((max(refresh_from, covered_from), end))
+            covered_from = min(covered_from, start)
+
+        for range_start, range_end in ranges:
+            lower, upper = format_date(range_start), format_date(range_end)
+            fetched = self._execute_query(self.SNAPSHOT_SQL, (country, fasin, lower, upper))
+            for row in fetched:
+                row["snapshot_date"] = format_date(row["snapshot_date"])
+            rows = [row for row in rows if not lower <= row["snapshot_date"] <= upper]
+            rows.extend(fetched)
+            LOGGER.info("Synced %d snapshot rows for %s/%s (%s ~ %s)", len(fetched), country, fasin, lower, upper)
+
+        if ranges:
+            rows.sort(key=lambda row: (row["snapshot_date"], row.get("asin") or ""))
+            self._save_snapshot_store(
+                path,
+                {
+                    "country": country,
+                    "fasin": fasin,
+                    "covered_from": format_date(covered_from),
+                    "watermark": max((row["snapshot_date"] for row in rows), default=None),
+                    "view_return_snapshot": rows,
+                },
+            )
+
+        lower, upper = format_date(start), format_date(end)
+        window_rows = [row for row in rows if lower <= row["snapshot_date"] <= upper]
+        self._write_dataset("view_return_snapshot", window_rows, dump_dir)
+        return window_rows
+
+    def fetch_snapshot(
+        self,
+        *,
+        mode: str,
+        country: str,
+        fasin: str,
+        start_date: str,
+        end_date: str,
+        lookback_days: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """Fetch snapshot rows in the given ``--snapshot-mode`` (aggregated, daily or incremental)."""
+        if mode == "aggregated":
+            return self.fetch_view_return_snapshot_agg(
+                country=country, fasin=fasin, start_date=start_date, end_date=end_date
+            )
+        if mode == "incremental":
+            return self.sync_view_return_snapshot(
+                country=country,
+                fasin=fasin,
+                start_date=start_date,
+                end_date=end_date,
+                lookback_days=lookback_days,
+            )
+        return self.fetch_view_return_snapshot(
+            country=country, fasin=fasin, start_date=start_date, end_date=end_date
+        )
+
+    def fetch_view_return_snapshot_agg(
+        self,
+        *,
+        country: str,
+        fasin: str,
+        start_date: str,
+        end_date: str,
+    ) -> List[Dict[str, Any]]:
+        """Fetch per-ASIN window totals, letting Doris do the SUM/GROUP BY."""
+        rows = self._execute_query(self.SNAPSHOT_AGG_SQL, (country, fasin, start_date, end_date))
+        self._write_dataset("view_return_snapshot_agg", rows)
+        return rows
+
     def fetch_view_return_fact_details(
         self,
         *,
@@ -118,11 +451,244 @@ class DorisClient:
         self._write_dataset("view_return_fact_details", rows)
         return rows
 
+    def _stream_dataset(
+        self,
+        table_name: str,
+        rows: Iterable[Dict[str, Any]],
+        directory: Optional[Path] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Pass rows through while writing them in the same layout as ``_write_dataset``.
+
+        The previous dump is removed as soon as the stream is created, so a stage that never
+        iterates it (no problem ASINs, reused artifact) does not leave stale rows behind; a
+        stream that is not read to the end removes its partial dump as well.
+        """
+        directory = directory or self.data_dir
+        directory.mkdir(parents=True, exist_ok=True)
+        file_path = dataset_path(directory, table_name, fmt=self.dataset_format, compress=self.compress)
+        self.dataset_digests.pop(table_name, None)
+        if file_path.exists():
+            file_path.unlink()
+        return self._dump_stream(table_name, rows, file_path)
+
+    def _dump_stream(
+        self,
+        table_name: str,
+        rows: Iterable[Dict[str, Any]],
+        file_path: Path,
+    ) -> Iterator[Dict[str, Any]]:
+        completed = False
+        try:
+            with open_dataset(file_path, "w") as handle:
+                writer = HashingWriter(handle)
+                row_writer = RowWriter(writer, table_name, self.dataset_format)
+                try:
+                    for row in rows:
+                        row_writer.write(row)
+                        yield row
+                    completed = True
+                finally:
+                    row_writer.close()
+            self.dataset_digests[table_name] = writer.hexdigest()
+        finally:
+            if not completed and file_path.exists():
+                file_path.unlink()
+
+    def _fetch_grouped(
+        self,
+        table_name: str,
+        sql_template: str,
+        *,
+        country: str,
+        fasins: Sequence[str],
+        start_date: str,
+        end_date: str,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        grouped: Dict[str, List[Dict[str, Any]]] = {fasin: [] for fasin in fasins}
+        if not grouped:
+            return grouped
+        placeholders = ", ".join(["%s"] * len(grouped))
+        sql = sql_template.format(placeholders=placeholders)
+        rows = self._execute_query(sql, (country, *grouped.keys(), start_date, end_date))
+        for row in rows:
+            bucket = grouped.get(row.get("fasin"))
+            if bucket is not None:
+                bucket.append(row)
+        for fasin, fasin_rows in grouped.items():
+            self._write_dataset(table_name, fasin_rows, self.data_dir / country / fasin)
+        return grouped
+
+    def fetch_view_return_snapshot_batch(
+        self,
+        *,
+        country: str,
+        fasins: Sequence[str],
+        start_date: str,
+        end_date: str,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Fetch snapshot rows for several parents with one ``fasin IN (...)`` query."""
+        return self._fetch_grouped(
+            "view_return_snapshot",
+            self.SNAPSHOT_BATCH_SQL,
+            country=country,
+            fasins=fasins,
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    def fetch_view_return_snapshot_agg_batch(
+        self,
+        *,
+        country: str,
+        fasins: Sequence[str],
+        start_date: str,
+        end_date: str,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Fetch per-ASIN window totals for several parents with one grouped query."""
+        return self._fetch_grouped(
+            "view_return_snapshot_agg",
+            self.SNAPSHOT_AGG_BATCH_SQL,
+            country=country,
+            fasins=fasins,
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    def fetch_view_return_fact_details_batch(
+        self,
+        *,
+        country: str,
+        fasins: Sequence[str],
+        start_date: str,
+        end_date: str,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Fetch fact rows for several parents with one ``fasin IN (...)`` query."""
+        return self._fetch_grouped(
+            "view_return_fact_details",
+            self.FACT_BATCH_SQL,
+            country=country,
+            fasins=fasins,
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    def stream_view_return_fact_details(
+        self,
+        *,
+        country: str,
+        fasin: str,
+        start_date: str,
+        end_date: str,
+        dump: bool = True,
+    ) -> Iterator[Dict[str, Any]]:
+        """Lazily yield fact rows from an unbuffered cursor; nothing is queried until iterated."""
+        rows = self._iter_query(self.FACT_SQL, (country, fasin, start_date, end_date))
+        if dump:
+            rows = self._stream_dataset("view_return_fact_details", rows)
+        return rows
+
+    def fetch_view_return_fact_tags(
+        self,
+        *,
+        country: str,
+        fasin: str,
+        start_date: str,
+        end_date: str,
+        stream: bool = False,
+    ) -> Iterable[Dict[str, Any]]:
+        """Phase 1 of the two-phase fact fetch: tag assignments only, without review text."""
+        params = (country, fasin, start_date, end_date)
+        if stream:
+            return self._stream_dataset("view_return_fact_tags", self._iter_query(self.FACT_TAG_SQL, params))
+        rows = self._execute_query(self.FACT_TAG_SQL, params)
+        self._write_dataset("view_return_fact_tags", rows)
+        return rows
+
+    def fetch_view_return_fact_texts(
+        self,
+        *,
+        country: str,
+        fasin: str,
+        start_date: str,
+        end_date: str,
+        reason_pairs: Iterable[Tuple[str, str]],
+    ) -> List[Dict[str, Any]]:
+        """Phase 2 of the two-phase fact fetch: full fact rows for the given (asin, tag_code) pairs."""
+        pairs = list(dict.fromkeys(reason_pairs))
+        rows: List[Dict[str, Any]] = []
+        for offset in range(0, len(pairs), self.FACT_TEXT_PAIRS_PER_QUERY):
+            chunk = pairs[offset : offset + self.FACT_TEXT_PAIRS_PER_QUERY]
+            pair_filter = " OR ".join(["(asin = %s AND tag_code = %s)"] * len(chunk))
+            params = [country, fasin, start_date, end_date]
+            for asin, tag_code in chunk:
+                params.extend((asin, tag_code))
+            rows.extend(self._execute_query(self.FACT_TEXT_SQL.format(pair_filter=pair_filter), params))
+        self._write_dataset("view_return_fact_details", rows)
+        return rows
+
     def fetch_return_dim_tag(self) -> List[Dict[str, Any]]:
         rows = self._execute_query(self.TAG_SQL, tuple())
         self._write_dataset("return_dim_tag", rows)
         return rows
 
-    def write_json(self, table_name: str, records: Any) -> Path:
-        return self._write_dataset(table_name, records, self.output_dir)
+    def write_json(
+        self,
+        table_name: str,
+        records: Any,
+        subdir: Optional[Path] = None,
+        *,
+        compact: bool = False,
+    ) -> Path:
+        directory = self.output_dir / subdir if subdir else self.output_dir
+        return self._write_dataset(table_name, records, directory, compact=compact)
+
+    def write_output(
+        self,
+        table_name: str,
+        records: Any,
+        *,
+        country: str,
+        fasin: str,
+        start_date: Any,
+        end_date: Any,
+        subdir: Optional[Path] = None,
+        compact: bool = False,
+    ) -> Path:
+        """
+        Write a stage output of one parent and window: into the partitioned output store when
+        enabled, otherwise to ``<output_dir>/<subdir>`` like ``write_json``.
+        """
+        if self.output_store is None:
+            return self.write_json(table_name, records, subdir, compact=compact)
+        return self.output_store.write(
+            table_name,
+            records,
+            country=country,
+            fasin=fasin,
+            start_date=start_date,
+            end_date=end_date,
+            compact=compact,
+        )
+
+    def remove_output(
+        self,
+        table_name: str,
+        *,
+        country: str,
+        fasin: str,
+        start_date: Any,
+        end_date: Any,
+        subdir: Optional[Path] = None,
+    ) -> List[Path]:
+        """Delete a stage output from where ``write_output`` with the same arguments would put it."""
+        if self.output_store is None:
+            directory = self.output_dir / subdir if subdir else self.output_dir
+            removed = remove_dataset(directory, table_name)
+            for path in removed:
+                LOGGER.info("Removed %s", path)
+            return removed
+        return self.output_store.remove(
+            table_name, country=country, fasin=fasin, start_date=start_date, end_date=end_date
+        )
 
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from array import array
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .calculator import parse_date
+from .metrics import instrument_stage
+
+GroupKey = Tuple[Optional[str], Optional[str]]
+
+
+class FactIndex:
+    """
+    view_return_fact_details rows of one run grouped by (asin, tag_code).
+
+    Built in a single pass that only records row positions; stages then visit the groups
+    they need, so their cost follows the problem ASINs and core reasons instead of the whole
+    fact table. Review dates are parsed once per group on first use and shared by every
+    stage, and positions give back the fetch order of any selection.
+    """
+
+    __slots__ = ("rows", "_groups", "_asin_tags", "_ordinals", "_day_ordinals")
+
+    def __init__(self, rows: List[Dict[str, Any]], groups: Dict[GroupKey, array]) -> None:
+        self.rows = rows
+        self._groups = groups
+        self._asin_tags: Dict[Optional[str], List[Optional[str]]] = {}
+        for asin, tag_code in groups:
+            self._asin_tags.setdefault(asin, []).append(tag_code)
+        self._ordinals: Dict[GroupKey, List[Optional[int]]] = {}
+        self._day_ordinals: Dict[str, int] = {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> "FactIndex":
+        rows = rows if isinstance(rows, list) else list(rows)
+        positions: Dict[GroupKey, array] = {}
+        get_positions = positions.get
+        for position, row in enumerate(rows):
+            key = (row.get("asin"), row.get("tag_code"))
+            group = get_positions(key)
+            if group is None:
+                group = positions[key] = array("q")
+            group.append(position)
+        # Keys keep first-seen order, so per-ASIN tags do too.
+        return cls(rows, positions)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def tag_codes(self, asin: str) -> List[Optional[str]]:
+        """Tag codes seen for ``asin`` in first-seen order; ``None``/``""`` mark untagged rows."""
+        return self._asin_tags.get(asin, [])
+
+    def _review_ordinal(self, value: Any) -> Optional[int]:
+        if isinstance(value, str):
+            day = value[:10]
+            ordinal = self._day_ordinals.get(day)
+            if ordinal is not None:
+                return ordinal
+            try:
+                ordinal = self._day_ordinals[day] = date.fromisoformat(day).toordinal()
+                return ordinal
+            except ValueError:
+                pass
+        elif isinstance(value, date):
+            return value.toordinal()
+        try:
+            return parse_date(value).toordinal()
+        except (TypeError, ValueError):
+            return None
+
+    def facts(self, asin: str, tag_code: Optional[str]) -> Iterator[Tuple[int, Optional[int], Dict[str, Any]]]:
+        """(position, review date ordinal or ``None`` if unparseable, row) of one group in fetch order."""
+        key = (asin, tag_code)
+        positions = self._groups.get(key)
+        if positions is None:
+            return iter(())
+        group_rows = [self.rows[position] for position in positions]
+        ordinals = self._ordinals.get(key)
+        if ordinals is None:
+            day_ordinals = self._day_ordinals
+            ordinals = self._ordinals[key] = []
+            for row in group_rows:
+                value = row.get("review_date")
+                # Most rows share their day with an earlier one; only new days are parsed.
+                ordinal = day_ordinals.get(value[:10]) if isinstance(value, str) else None
+                ordinals.append(ordinal if ordinal is not None else self._review_ordinal(value))
+        return zip(positions, ordinals, group_rows)
+
+    def rows_at(self, positions: Iterable[int]) -> List[Dict[str, Any]]:
+        """Rows at ``positions``, back in fetch order."""
+        rows = self.rows
+        return [rows[position] for position in sorted(positions)]
+
+
+@instrument_stage("fact_index")
+def build_fact_index(rows: Iterable[Dict[str, Any]]) -> FactIndex:
+    return FactIndex.from_rows(rows)
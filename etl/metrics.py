@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections.abc import Sized
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+try:  # resource is POSIX only; peak RSS is reported as null elsewhere.
+    import resource
+except ImportError:  # pragma: no cover - depends on the platform
+    resource = None
+
+from .profiling import active_session
+
+LOGGER = logging.getLogger("etl.metrics")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_ACTIVE: Optional["MetricsRecorder"] = None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+def count_rows(value: Any) -> Optional[int]:
+    if isinstance(value, dict):
+        return 1
+    if isinstance(value, Sized) and not isinstance(value, (str, bytes)):
+        return len(value)
+    return None
+
+
+def _render_labels(labels: Dict[str, str]) -> str:
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in sorted(labels.items())
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRecorder:
+    """Collects timed events (queries, stages, writes) of one run; safe to use from fetch threads."""
+
+    def __init__(self, labels: Optional[Dict[str, str]] = None) -> None:
+        self.labels = {key: str(value) for key, value in (labels or {}).items() if value is not None}
+        self.events: List[Dict[str, Any]] = []
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self.status = "ok"
+        self._lock = threading.Lock()
+
+    def add(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def measure(self, kind: str, name: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """Time the block; the yielded dict takes ``rows_out``/``bytes`` and other fields."""
+        event: Dict[str, Any] = {"kind": kind, "name": name, **fields}
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield event
+        finally:
+            event["wall_seconds"] = round(time.perf_counter() - wall, 6)
+            event["cpu_seconds"] = round(time.thread_time() - cpu, 6)
+            event["peak_rss_bytes"] = peak_rss_bytes()
+            self.add(event)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "labels": self.labels,
+            "status": self.status,
+            "started_at": self.started_at,
+            "wall_seconds": round(time.perf_counter() - self._started, 6),
+            "cpu_seconds": round(time.process_time() - self._started_cpu, 6),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "events": list(self.events),
+        }
+
+    def to_prometheus(self, summary: Dict[str, Any]) -> str:
+        """Prometheus textfile exposition; events with the same kind/name/labels are summed."""
+        totals: Dict[tuple, Dict[str, float]] = {}
+        for event in summary["events"]:
+            labels = {**self.labels, **{key: str(event[key]) for key in ("country", "fasin") if event.get(key)}}
+            key = (event["kind"], event["name"], tuple(sorted(labels.items())))
+            bucket = totals.setdefault(key, {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+            bucket["count"] += 1
+            bucket["wall_seconds"] += event.get("wall_seconds") or 0.0
+            bucket["cpu_seconds"] += event.get("cpu_seconds") or 0.0
+            for field_name in ("rows_in", "rows_out", "bytes"):
+                if event.get(field_name) is not None:
+                    bucket[field_name] = bucket.get(field_name, 0) + event[field_name]
+
+        lines: List[str] = []
+        families = [
+            ("count", "etl_stage_calls", "gauge", "Number of timed calls"),
+            ("wall_seconds", "etl_stage_wall_seconds", "gauge", "Wall time per stage"),
+            ("cpu_seconds", "etl_stage_cpu_seconds", "gauge", "Thread CPU time per stage"),
+            ("rows_in", "etl_stage_rows_in", "gauge", "Rows read by the stage"),
+            ("rows_out", "etl_stage_rows_out", "gauge", "Rows produced by the stage"),
+            ("bytes", "etl_stage_bytes", "gauge", "Bytes fetched (queries) or written (writes)"),
+        ]
+        for field_name, metric, metric_type, help_text in families:
+            samples = [
+                (dict(labels, kind=kind, stage=name), values[field_name])
+                for (kind, name, labels), values in totals.items()
+                if field_name in values
+            ]
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            lines.extend(f"{metric}{_render_labels(labels)} {value:g}" for labels, value in samples)
+        run_labels = _render_labels(self.labels)
+        lines.append("# HELP etl_run_wall_seconds Wall time of the run")
+        lines.append("# TYPE etl_run_wall_seconds gauge")
+        lines.append(f"etl_run_wall_seconds{run_labels} {summary['wall_seconds']:g}")
+        lines.append("# HELP etl_run_cpu_seconds Process CPU time of the run")
+        lines.append("# TYPE etl_run_cpu_seconds gauge")
+        lines.append(f"etl_run_cpu_seconds{run_labels} {summary['cpu_seconds']:g}")
+        if summary["peak_rss_bytes"] is not None:
+            lines.append("# HELP etl_run_peak_rss_bytes Peak resident set size of the run")
+            lines.append("# TYPE etl_run_peak_rss_bytes gauge")
+            lines.append(f"etl_run_peak_rss_bytes{run_labels} {summary['peak_rss_bytes']}")
+        lines.append("# HELP etl_run_success Whether the run finished without an error")
+        lines.append("# TYPE etl_run_success gauge")
+        lines.append(f"etl_run_success{run_labels} {1 if summary['status'] == 'ok' else 0}")
+        lines.append("# HELP etl_run_finished_timestamp_seconds Finish time of the run")
+        lines.append("# TYPE etl_run_finished_timestamp_seconds gauge")
+        lines.append(f"etl_run_finished_timestamp_seconds{run_labels} {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_dir: Path) -> Path:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        summary = self.summary()
+        json_path = output_dir / "run_metrics.json"
+        json_path.write_text(json.dumps({"run_metrics": summary}, ensure_ascii=False, indent=2), encoding="utf-8")
+        # Write-then-rename so node_exporter's textfile collector never reads a partial file.
+        prom_path = output_dir / "run_metrics.prom"
+        tmp_path = prom_path.with_suffix(f".prom.{os.getpid()}.tmp")
+        tmp_path.write_text(self.to_prometheus(summary), encoding="utf-8")
+        os.replace(tmp_path, prom_path)
+        return json_path
+
+
+def active_recorder() -> Optional[MetricsRecorder]:
+    return _ACTIVE
+
+
+@contextmanager
+def measure(kind: str, name: str, **fields: Any) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Time the block on the active recorder and profile ``stage`` blocks under ``--profile``.
+
+    Yields the event dict, or ``None`` when metrics are off; does nothing when both are off.
+    """
+    recorder = _ACTIVE
+    session = active_session() if kind == "stage" else None
+    if recorder is None and session is None:
+        yield None
+        return
+    with ExitStack() as stack:
+        if session is not None:
+            stack.enter_context(session.profile(name))
+        yield None if recorder is None else stack.enter_context(recorder.measure(kind, name, **fields))
+
+
+@contextmanager
+def run_metrics(enabled: bool, output_dir: Path, **labels: Any) -> Iterator[Optional[MetricsRecorder]]:
+    """Activate a recorder for the block and write run_metrics.json/.prom into ``output_dir``."""
+    global _ACTIVE
+    if not enabled:
+        yield None
+        return
+    recorder = MetricsRecorder(labels)
+    previous, _ACTIVE = _ACTIVE, recorder
+    try:
+        yield recorder
+    except BaseException:
+        recorder.status = "failed"
+        raise
+    finally:
+        _ACTIVE = previous
+        path = recorder.write(output_dir)
+        LOGGER.info("Run metrics written to %s", path)
+
+
+def collect_events(func: Callable[..., Any], *args: Any, **kwargs: Any) -> tuple:
+    """Run ``func`` under a fresh recorder (e.g. in a worker process) and return ``(result, events)``."""
+    global _ACTIVE
+    recorder = MetricsRecorder()
+    previous, _ACTIVE = _ACTIVE, recorder
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        _ACTIVE = previous
+    return result, recorder.events
+
+
+def instrument_stage(name: str, rows_arg: str = "rows") -> Callable[[F], F]:
+    """Decorator recording (and profiling) a compute stage; only ``None`` checks run while both are off."""
+
+    def decorate(func: F) -> F:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            recorder = _ACTIVE
+            if recorder is None and active_session() is None:
+                return func(*args, **kwargs)
+            rows_in = None
+            if recorder is not None:
+                rows_in = count_rows(signature.bind_partial(*args, **kwargs).arguments.get(rows_arg))
+            with measure("stage", name, rows_in=rows_in) as event:
+                result = func(*args, **kwargs)
+                if event is not None:
+                    event["rows_out"] = count_rows(result)
+            return result
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
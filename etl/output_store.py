@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .dataset_io import HashingWriter, dataset_path, open_dataset, remove_dataset, resolve_format, write_records
+from .metrics import count_rows, measure
+
+LOGGER = logging.getLogger("etl.output_store")
+
+MANIFEST_NAME = "manifest.ndjson"
+
+
+def _partition_value(name: str, value: Any) -> str:
+    text = str(value or "").strip()
+    if not text or any(char in text for char in "/\\=") or text in {".", ".."}:
+        raise ValueError(f"Invalid {name} partition value: {value!r}")
+    return text
+
+
+def partition_path(country: str, fasin: str, start_date: Any, end_date: Any) -> Path:
+    """Relative ``country=<c>/fasin=<f>/window=<start>_<end>`` directory of one parent and window."""
+    return (
+        Path(f"country={_partition_value('country', country)}")
+        / f"fasin={_partition_value('fasin', fasin)}"
+        / f"window={_partition_value('start_date', start_date)}_{_partition_value('end_date', end_date)}"
+    )
+
+
+def read_manifest(root: Path, *, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Manifest entries appended after byte ``offset`` and the offset to resume from.
+
+    A consumer keeps the returned offset and passes it back next time to see only the
+    artifacts written since; a line still being appended is left for the next read.
+    """
+    path = Path(root) / MANIFEST_NAME
+    if not path.exists():
+        return [], 0
+    entries: List[Dict[str, Any]] = []
+    with path.open("rb") as handle:
+        handle.seek(offset)
+        for line in handle:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if line.strip():
+                entries.append(json.loads(line))
+    return entries, offset
+
+
+def latest_entries(root: Path) -> Dict[str, Dict[str, Any]]:
+    """Newest manifest entry per artifact path."""
+    entries, _ = read_manifest(root)
+    return {entry["path"]: entry for entry in entries}
+
+
+def changed_entries(root: Path, known_checksums: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Artifacts whose checksum differs from ``known_checksums`` (path -> sha256) or that are new;
+    removed artifacts come back as their ``removed`` entry.
+    """
+    return [
+        entry
+        for path, entry in latest_entries(root).items()
+        if known_checksums.get(path) != entry["sha256"]
+    ]
+
+
+def find_artifact(
+    root: Path,
+    table_name: str,
+    *,
+    country: Optional[str] = None,
+    fasin: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """Newest manifest entry of ``table_name`` matching the given partition keys whose file still exists."""
+    wanted = {"country": country, "fasin": fasin, "start_date": start_date, "end_date": end_date}
+    entries, _ = read_manifest(root)
+    for entry in reversed(entries):
+        if entry.get("table") != table_name:
+            continue
+        if any(value is not None and str(entry.get(key)) != str(value) for key, value in wanted.items()):
+            continue
+        if (Path(root) / entry["path"]).exists():
+            return entry
+    return None
+
+
+class OutputStore:
+    """
+    Stage outputs partitioned by ``country=/fasin=/window=`` under ``root``.
+
+    Every artifact is written to a temp file in its partition and renamed into place, so
+    readers never see a partial file and runs for other parents or windows are untouched.
+    Each write that changes an artifact appends one line to ``manifest.ndjson`` with its
+    path, sha256 of the serialized text, row count, size and generation time; rewriting
+    identical content leaves the file and the manifest as they were. Deleting an artifact
+    appends an entry with ``removed`` set and no checksum.
+    """
+
+    def __init__(self, root: Path, *, fmt: str = "json", compress: bool = False) -> None:
+        self.root = Path(root)
+        self.fmt = fmt
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._checksums = {path: entry["sha256"] for path, entry in latest_entries(self.root).items()}
+
+    def write(
+        self,
+        table_name: str,
+        records: Any,
+        *,
+        country: str,
+        fasin: str,
+        start_date: Any,
+        end_date: Any,
+        compact: bool = False,
+    ) -> Path:
+        directory = self.root / partition_path(country, fasin, start_date, end_date)
+        directory.mkdir(parents=True, exist_ok=True)
+        fmt = "compact" if compact and self.fmt == "json" else self.fmt
+        fmt = resolve_format(records, fmt)
+        path = dataset_path(directory, table_name, fmt=fmt, compress=self.compress)
+        relative = path.relative_to(self.root).as_posix()
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        rows = count_rows(records)
+        with measure("write", table_name, rows_in=rows) as event:
+            try:
+                with open_dataset(tmp_path, "w") as handle:
+                    writer = HashingWriter(handle)
+                    write_records(writer, table_name, records, fmt)
+                checksum = writer.hexdigest()
+                with self._lock:
+                    if self._checksums.get(relative) == checksum and path.exists():
+                        LOGGER.debug("%s unchanged, keeping %s", table_name, path)
+                        return path
+                    os.replace(tmp_path, path)
+                    self._append_manifest(
+                        {
+                            "path": relative,
+                            "table": table_name,
+                            "country": country,
+                            "fasin": fasin,
+                            "start_date": str(start_date),
+                            "end_date": str(end_date),
+                            "format": fmt,
+                            "compressed": self.compress,
+                            "rows": rows,
+                            "bytes": writer.size,
+                            "sha256": checksum,
+                            "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                        }
+                    )
+                    self._checksums[relative] = checksum
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            if event is not None:
+                event["bytes"] = writer.size
+        return path
+
+    def remove(
+        self,
+        table_name: str,
+        *,
+        country: str,
+        fasin: str,
+        start_date: Any,
+        end_date: Any,
+    ) -> List[Path]:
+        """Delete ``table_name`` from one partition in any format, recording each removal in the manifest."""
+        directory = self.root / partition_path(country, fasin, start_date, end_date)
+        with self._lock:
+            removed = remove_dataset(directory, table_name) if directory.exists() else []
+            for path in removed:
+                relative = path.relative_to(self.root).as_posix()
+                self._append_manifest(
+                    {
+                        "path": relative,
+                        "table": table_name,
+                        "country": country,
+                        "fasin": fasin,
+                        "start_date": str(start_date),
+                        "end_date": str(end_date),
+                        "removed": True,
+                        "sha256": None,
+                        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    }
+                )
+                self._checksums.pop(relative, None)
+        for path in removed:
+            LOGGER.info("Removed %s", path)
+        return removed
+
+    def _append_manifest(self, entry: Dict[str, Any]) -> None:
+        # One short line per append, so concurrent writers interleave whole entries.
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with (self.root / MANIFEST_NAME).open("a", encoding="utf-8") as handle:
+            handle.write(line)
+
@@ -1,8 +1,12 @@
 ﻿from __future__ import annotations
 
-from typing import Dict, Iterable
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Union
 
 from .calculator import calc_rate, format_date, parse_date, round_float
+from .metrics import instrument_stage
+from .snapshot_cube import SnapshotCube
+from .snapshot_frame import SnapshotFrame
 
 
 def normalize_number(value) -> float:
@@ -21,6 +25,7 @@ def filter_snapshot(
     fasin: str,
     start_date,
     end_date,
+    aggregated: bool = False,
 ):
     start = parse_date(start_date)
     end = parse_date(end_date)
@@ -29,33 +34,136 @@ def filter_snapshot(
             continue
         if row.get("fasin") != fasin:
             continue
+        if aggregated:
+            # Pre-aggregated rows carry no snapshot_date; Doris already applied the window.
+            yield row
+            continue
         snapshot_date = parse_date(row.get("snapshot_date"))
         if snapshot_date < start or snapshot_date > end:
             continue
         yield row
 
 
+@dataclass
+class SnapshotAggregate:
+    """Parent totals and per-ASIN buckets of one parent/window, built in a single snapshot pass."""
+
+    country: str
+    fasin: str
+    start_date: str
+    end_date: str
+    units_sold: float = 0.0
+    units_returned: float = 0.0
+    asin_totals: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    def check(self, *, country: str, fasin: str, start_date: str, end_date: str) -> None:
+        if (self.country, self.fasin, self.start_date, self.end_date) != (country, fasin, start_date, end_date):
+            raise ValueError(
+                f"Snapshot aggregate for {self.country}/{self.fasin} {self.start_date}~{self.end_date} "
+                f"does not match {country}/{fasin} {start_date}~{end_date}"
+            )
+
+
+SnapshotInput = Union[Iterable[Dict], SnapshotFrame, SnapshotCube, SnapshotAggregate]
+
+
+def aggregate_snapshot(
+    rows: Union[Iterable[Dict], SnapshotFrame, SnapshotCube],
+    *,
+    country: str,
+    fasin: str,
+    start_date,
+    end_date,
+    aggregated: bool = False,
+) -> SnapshotAggregate:
+    """Single pass over the snapshot that feeds both calculate_parent_summary and build_asin_structure."""
+    result = SnapshotAggregate(
+        country=country,
+        fasin=fasin,
+        start_date=format_date(start_date),
+        end_date=format_date(end_date),
+    )
+    if isinstance(rows, (SnapshotFrame, SnapshotCube)):
+        if rows.matches(country, fasin):
+            for asin, (units_sold, units_returned) in rows.group_sums(result.start_date, result.end_date).items():
+                result.units_sold += units_sold
+                result.units_returned += units_returned
+                # Rows without an ASIN count towards the parent only, as on the row path below.
+                if asin:
+                    result.asin_totals[asin] = {
+                        "units_sold": float(units_sold),
+                        "units_returned": float(units_returned),
+                    }
+        return result
+
+    asin_totals = result.asin_totals
+    for row in filter_snapshot(
+        rows,
+        country=country,
+        fasin=fasin,
+        start_date=result.start_date,
+        end_date=result.end_date,
+        aggregated=aggregated,
+    ):
+        units_sold = normalize_number(row.get("units_sold"))
+        units_returned = normalize_number(row.get("units_returned"))
+        result.units_sold += units_sold
+        result.units_returned += units_returned
+        asin = row.get("asin")
+        if not asin:
+            continue
+        asin_bucket = asin_totals.get(asin)
+        if asin_bucket is None:
+            asin_bucket = asin_totals[asin] = {"units_sold": 0.0, "units_returned": 0.0}
+        asin_bucket["units_sold"] += units_sold
+        asin_bucket["units_returned"] += units_returned
+    return result
+
+
+def resolve_snapshot_aggregate(
+    rows: SnapshotInput,
+    *,
+    country: str,
+    fasin: str,
+    start_date: str,
+    end_date: str,
+    aggregated: bool = False,
+) -> SnapshotAggregate:
+    if isinstance(rows, SnapshotAggregate):
+        rows.check(country=country, fasin=fasin, start_date=start_date, end_date=end_date)
+        return rows
+    return aggregate_snapshot(
+        rows,
+        country=country,
+        fasin=fasin,
+        start_date=start_date,
+        end_date=end_date,
+        aggregated=aggregated,
+    )
+
+
+@instrument_stage("parent_summary")
 def calculate_parent_summary(
-    rows: Iterable[Dict],
+    rows: SnapshotInput,
     *,
     country: str,
     fasin: str,
     start_date,
     end_date,
+    aggregated: bool = False,
 ) -> Dict:
     start_fmt = format_date(start_date)
     end_fmt = format_date(end_date)
-    filtered = list(
-        filter_snapshot(
-            rows,
-            country=country,
-            fasin=fasin,
-            start_date=start_fmt,
-            end_date=end_fmt,
-        )
+    snapshot = resolve_snapshot_aggregate(
+        rows,
+        country=country,
+        fasin=fasin,
+        start_date=start_fmt,
+        end_date=end_fmt,
+        aggregated=aggregated,
     )
-    total_units_sold = sum(normalize_number(row.get("units_sold")) for row in filtered)
-    total_units_returned = sum(normalize_number(row.get("units_returned")) for row in filtered)
+    total_units_sold = snapshot.units_sold
+    total_units_returned = snapshot.units_returned
     summary = {
         "country": country,
         "fasin": fasin,
@@ -2,23 +2,280 @@ from __future__ import annotations
 
 import argparse
 import logging
-from typing import Dict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar, Union
 
+from .artifact_cache import StageArtifacts
 from .asin_structure import build_asin_structure
-from .cli_utils import build_stage_parser, format_window, resolve_runtime
-from .doris_client import DorisClient
-from .parent_summary import calculate_parent_summary
+from .cli_utils import (
+    build_stage_artifacts,
+    build_stage_parser,
+    collect_input_digests,
+    format_window,
+    resolve_runtime,
+    stage_instrumentation,
+)
+from .config import ThresholdConfig
+from .data_source import create_client
+from .fact_index import FactIndex, build_fact_index
+from .metrics import count_rows, measure
+from .parent_summary import SnapshotAggregate, aggregate_snapshot, calculate_parent_summary
 from .problem_reasons import build_problem_reasons
-from .reason_explanations import build_reason_explanations
+from .reason_explanations import (
+    build_reason_explanations,
+    core_reason_pairs,
+    explanation_tables,
+    stale_explanation_tables,
+)
+from .snapshot_frame import SnapshotFrame
 
 LOGGER = logging.getLogger("etl.pipeline")
 
+T = TypeVar("T")
+
+# Snapshot, fact and tag queries are independent and run side by side.
+FETCH_WORKERS = 3
+
 
 def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     parser = build_stage_parser("Amazon return analysis ETL pipeline")
     return parser.parse_args(argv)
 
 
+def _run_stage(
+    artifacts: Optional[StageArtifacts],
+    digests: Dict[str, Optional[str]],
+    name: str,
+    inputs: Iterable[str],
+    compute: Callable[[], T],
+) -> T:
+    if artifacts is None:
+        return compute()
+    return artifacts.get_or_compute(name, {key: digests.get(key) for key in inputs}, compute)
+
+
+def compute_snapshot_stages(
+    *,
+    snapshot_rows: Iterable[Dict],
+    thresholds: ThresholdConfig,
+    country: str,
+    fasin: str,
+    start_date,
+    end_date,
+    aggregated_snapshot: bool = False,
+    artifacts: Optional[StageArtifacts] = None,
+    input_digests: Optional[Dict[str, Optional[str]]] = None,
+) -> Tuple[Dict, List[Dict]]:
+    """
+    Run 4.1 and 4.2 for one parent.
+
+    ``snapshot_rows`` is read once into a columnar ``SnapshotFrame`` and aggregated in a
+    single pass shared by both stages. The aggregation is skipped entirely when both
+    artifacts are reused from ``artifacts``.
+    """
+    digests = input_digests or {}
+    snapshot_state: Dict[str, SnapshotAggregate] = {}
+
+    def snapshot_aggregate() -> SnapshotAggregate:
+        if "aggregate" not in snapshot_state:
+            with measure("stage", "snapshot_aggregate", rows_in=count_rows(snapshot_rows)) as event:
+                snapshot_frame = SnapshotFrame.from_rows(
+                    snapshot_rows,
+                    country=country,
+                    fasin=fasin,
+                    aggregated=aggregated_snapshot,
+                )
+                snapshot_state["aggregate"] = aggregate_snapshot(
+                    snapshot_frame,
+                    country=country,
+                    fasin=fasin,
+                    start_date=start_date,
+                    end_date=end_date,
+                )
+                if event is not None:
+                    event["rows_out"] = len(snapshot_state["aggregate"].asin_totals)
+        return snapshot_state["aggregate"]
+
+    parent_summary = _run_stage(
+        artifacts,
+        digests,
+        "parent_summary",
+        ("snapshot",),
+        lambda: calculate_parent_summary(
+            snapshot_aggregate(),
+            country=country,
+            fasin=fasin,
+            start_date=start_date,
+            end_date=end_date,
+        ),
+    )
+    LOGGER.info(
+        "Parent summary: units_sold=%s units_returned=%s return_rate=%.4f",
+        parent_summary.get("units_sold"),
+        parent_summary.get("units_returned"),
+        parent_summary.get("return_rate"),
+    )
+
+    asin_structure = _run_stage(
+        artifacts,
+        digests,
+        "asin_structure",
+        ("snapshot",),
+        lambda: build_asin_structure(
+            snapshot_aggregate(),
+            country=country,
+            fasin=fasin,
+            start_date=start_date,
+            end_date=end_date,
+            parent_summary=parent_summary,
+            thresholds=thresholds,
+        ),
+    )
+    LOGGER.info("Identified %d ASIN rows", len(asin_structure))
+    return parent_summary, asin_structure
+
+
+def index_fact_rows(
+    fact_rows: Iterable[Dict],
+    explanation_fact_loader: Optional[Callable[[List[Dict]], Iterable[Dict]]] = None,
+) -> Union[Iterable[Dict], FactIndex]:
+    """
+    Index fully fetched fact rows by (asin, tag_code) once for 4.3 and the explanations.
+
+    Streams and two-phase facts are read by one stage each and pass through unchanged.
+    """
+    if explanation_fact_loader is None and isinstance(fact_rows, list):
+        return build_fact_index(fact_rows)
+    return fact_rows
+
+
+def compute_problem_reasons(
+    *,
+    asin_structure: List[Dict],
+    fact_rows: Union[Iterable[Dict], FactIndex],
+    tag_dim: Iterable[Dict],
+    thresholds: ThresholdConfig,
+    country: str,
+    fasin: str,
+    start_date,
+    end_date,
+    artifacts: Optional[StageArtifacts] = None,
+    input_digests: Optional[Dict[str, Optional[str]]] = None,
+) -> List[Dict]:
+    """Run 4.3, reusing the cached artifact when snapshot, fact and tag inputs are unchanged."""
+    problem_reasons = _run_stage(
+        artifacts,
+        input_digests or {},
+        "problem_asin_reasons",
+        ("snapshot", "facts", "tags"),
+        lambda: build_problem_reasons(
+            asin_structure=asin_structure,
+            fact_rows=fact_rows,
+            tag_dimension=tag_dim,
+            thresholds=thresholds,
+            country=country,
+            fasin=fasin,
+            start_date=start_date,
+            end_date=end_date,
+        ),
+    )
+    LOGGER.info("Computed %d problem ASIN reason rows", len(problem_reasons))
+    return problem_reasons
+
+
+def compute_reason_explanations(
+    *,
+    problem_reasons: List[Dict],
+    fact_rows: Union[Iterable[Dict], FactIndex],
+    explanation_fact_loader: Optional[Callable[[List[Dict]], Iterable[Dict]]] = None,
+    max_evidence_per_reason: int = 0,
+) -> List[Dict]:
+    explanation_rows = fact_rows if explanation_fact_loader is None else explanation_fact_loader(problem_reasons)
+    reason_explanations = build_reason_explanations(
+        problem_reasons=problem_reasons,
+        fact_rows=explanation_rows,
+        max_evidence_per_reason=max_evidence_per_reason,
+    )
+    LOGGER.info("Filtered %d reason explanation rows", len(reason_explanations))
+    return reason_explanations
+
+
+def compute_parent_outputs(
+    *,
+    snapshot_rows: Iterable[Dict],
+    fact_rows: Iterable[Dict],
+    tag_dim: Iterable[Dict],
+    thresholds: ThresholdConfig,
+    country: str,
+    fasin: str,
+    start_date,
+    end_date,
+    aggregated_snapshot: bool = False,
+    explanation_fact_loader: Optional[Callable[[List[Dict]], Iterable[Dict]]] = None,
+    max_evidence_per_reason: int = 0,
+    artifacts: Optional[StageArtifacts] = None,
+    input_digests: Optional[Dict[str, Optional[str]]] = None,
+) -> Dict[str, object]:
+    """
+    Run 4.1/4.2/4.3 and the reason explanations for one parent on pre-fetched rows.
+
+    ``fact_rows`` is read once by the reason stage. When it is a one-shot stream or lacks
+    review text, pass ``explanation_fact_loader``: it receives the problem reasons and
+    returns the fact rows for the explanation stage. ``max_evidence_per_reason`` caps the
+    explanation rows kept per core reason (0 keeps all).
+
+    With ``artifacts``, 4.1/4.2/4.3 are reused from the artifact cache when the
+    ``input_digests`` of their ``snapshot``/``facts``/``tags`` inputs match.
+    """
+    parent_summary, asin_structure = compute_snapshot_stages(
+        snapshot_rows=snapshot_rows,
+        thresholds=thresholds,
+        country=country,
+        fasin=fasin,
+        start_date=start_date,
+        end_date=end_date,
+        aggregated_snapshot=aggregated_snapshot,
+        artifacts=artifacts,
+        input_digests=input_digests,
+    )
+    fact_rows = index_fact_rows(fact_rows, explanation_fact_loader)
+    problem_reasons = compute_problem_reasons(
+        asin_structure=asin_structure,
+        fact_rows=fact_rows,
+        tag_dim=tag_dim,
+        thresholds=thresholds,
+        country=country,
+        fasin=fasin,
+        start_date=start_date,
+        end_date=end_date,
+        artifacts=artifacts,
+        input_digests=input_digests,
+    )
+    reason_explanations = compute_reason_explanations(
+        problem_reasons=problem_reasons,
+        fact_rows=fact_rows,
+        explanation_fact_loader=explanation_fact_loader,
+        max_evidence_per_reason=max_evidence_per_reason,
+    )
+
+    return {
+        "parent_summary": parent_summary,
+        "asin_structure": asin_structure,
+        "problem_asin_reasons": problem_reasons,
+        "reason_explanations": reason_explanations,
+    }
+
+
+def output_tables(outputs: Dict[str, object], explanation_layout: str = "rows") -> Dict[str, object]:
+    """Tables to write for ``outputs``, with reason_explanations laid out per ``explanation_layout``."""
+    tables: Dict[str, object] = {}
+    for table_name, payload in outputs.items():
+        if table_name == "reason_explanations":
+            tables.update(explanation_tables(payload, explanation_layout))
+        else:
+            tables[table_name] = payload
+    return tables
+
 
 def run_pipeline(args: argparse.Namespace | None = None) -> Dict[str, object]:
     if args is None:
@@ -32,71 +289,135 @@ def run_pipeline(args: argparse.Namespace | None = None) -> Dict[str, object]:
 
     start_str, end_str = format_window(start_date, end_date)
 
-    with DorisClient(config.database, config.paths) as client:
-        snapshot_rows = client.fetch_view_return_snapshot(
+    aggregated = args.snapshot_mode == "aggregated"
+    with stage_instrumentation(args, config, "pipeline"), create_client(config) as client, ThreadPoolExecutor(
+        max_workers=FETCH_WORKERS, thread_name_prefix="etl-fetch"
+    ) as fetch_pool:
+        snapshot_future = fetch_pool.submit(
+            client.fetch_snapshot,
+            mode=args.snapshot_mode,
             country=args.country,
             fasin=args.fasin,
             start_date=start_str,
             end_date=end_str,
+            lookback_days=args.lookback_days,
         )
-        parent_summary = calculate_parent_summary(
-            snapshot_rows,
-            country=args.country,
-            fasin=args.fasin,
-            start_date=start_date,
-            end_date=end_date,
-        )
-        LOGGER.info(
-            "Parent summary: units_sold=%s units_returned=%s return_rate=%.4f",
-            parent_summary.get("units_sold"),
-            parent_summary.get("units_returned"),
-            parent_summary.get("return_rate"),
-        )
+        tag_future = fetch_pool.submit(client.fetch_return_dim_tag)
+
+        explanation_fact_loader = None
+        if args.two_phase_facts:
+
+            def fetch_facts() -> Iterable[Dict]:
+                return client.fetch_view_return_fact_tags(
+                    country=args.country,
+                    fasin=args.fasin,
+                    start_date=start_str,
+                    end_date=end_str,
+                    stream=args.stream,
+                )
+
+            def explanation_fact_loader(reasons: List[Dict]) -> Iterable[Dict]:
+                return client.fetch_view_return_fact_texts(
+                    country=args.country,
+                    fasin=args.fasin,
+                    start_date=start_str,
+                    end_date=end_str,
+                    reason_pairs=core_reason_pairs(reasons),
+                )
 
-        asin_structure = build_asin_structure(
-            snapshot_rows,
+        elif args.stream:
+
+            def fetch_facts() -> Iterable[Dict]:
+                return client.stream_view_return_fact_details(
+                    country=args.country,
+                    fasin=args.fasin,
+                    start_date=start_str,
+                    end_date=end_str,
+                )
+
+            def explanation_fact_loader(reasons: List[Dict]) -> Iterable[Dict]:
+                # Second pass for the explanations; the first stream was drained by the reason stage.
+                return client.stream_view_return_fact_details(
+                    country=args.country,
+                    fasin=args.fasin,
+                    start_date=start_str,
+                    end_date=end_str,
+                    dump=False,
+                )
+
+        else:
+
+            def fetch_facts() -> Iterable[Dict]:
+                return client.fetch_view_return_fact_details(
+                    country=args.country,
+                    fasin=args.fasin,
+                    start_date=start_str,
+                    end_date=end_str,
+                )
+
+        # Streams are consumed lazily by the reason stage; everything else downloads in the background.
+        fact_future: Optional[Future] = None if args.stream else fetch_pool.submit(fetch_facts)
+
+        artifacts = build_stage_artifacts(args, config, start_date, end_date)
+        # 4.1/4.2 only need the snapshot, so they run while facts and tags are still in flight.
+        parent_summary, asin_structure = compute_snapshot_stages(
+            snapshot_rows=snapshot_future.result(),
+            thresholds=config.thresholds,
             country=args.country,
             fasin=args.fasin,
             start_date=start_date,
             end_date=end_date,
-            parent_summary=parent_summary,
-            thresholds=config.thresholds,
+            aggregated_snapshot=aggregated,
+            artifacts=artifacts,
+            input_digests=collect_input_digests(client, args),
         )
-        LOGGER.info("Identified %d ASIN rows", len(asin_structure))
-
-        fact_rows = client.fetch_view_return_fact_details(
-            country=args.country,
-            fasin=args.fasin,
-            start_date=start_str,
-            end_date=end_str,
+        fact_rows = index_fact_rows(
+            fetch_facts() if fact_future is None else fact_future.result(),
+            explanation_fact_loader,
         )
-        tag_dim = client.fetch_return_dim_tag()
-        problem_reasons = build_problem_reasons(
+        tag_dim = tag_future.result()
+        problem_reasons = compute_problem_reasons(
             asin_structure=asin_structure,
             fact_rows=fact_rows,
-            tag_dimension=tag_dim,
+            tag_dim=tag_dim,
             thresholds=config.thresholds,
             country=args.country,
             fasin=args.fasin,
             start_date=start_date,
             end_date=end_date,
+            artifacts=artifacts,
+            input_digests=collect_input_digests(client, args),
         )
-        LOGGER.info("Computed %d problem ASIN reason rows", len(problem_reasons))
-        reason_explanations = build_reason_explanations(
+        reason_explanations = compute_reason_explanations(
             problem_reasons=problem_reasons,
             fact_rows=fact_rows,
+            explanation_fact_loader=explanation_fact_loader,
+            max_evidence_per_reason=config.max_evidence_per_reason,
         )
-        LOGGER.info("Filtered %d reason explanation rows", len(reason_explanations))
-
         outputs = {
             "parent_summary": parent_summary,
             "asin_structure": asin_structure,
             "problem_asin_reasons": problem_reasons,
             "reason_explanations": reason_explanations,
         }
-        for table_name, payload in outputs.items():
-            output_path = client.write_json(table_name, payload)
+        for table_name, payload in output_tables(outputs, config.paths.explanation_layout).items():
+            output_path = client.write_output(
+                table_name,
+                payload,
+                country=args.country,
+                fasin=args.fasin,
+                start_date=start_str,
+                end_date=end_str,
+            )
             LOGGER.info("Wrote %s to %s", table_name, output_path)
+        for table_name in stale_explanation_tables(config.paths.explanation_layout):
+            client.remove_output(
+                table_name,
+                country=args.country,
+                fasin=args.fasin,
+                start_date=start_str,
+                end_date=end_str,
+            )
 
     return outputs
 
@@ -1,14 +1,18 @@
 ﻿from __future__ import annotations
 
-from collections import defaultdict
-from typing import Dict, Iterable, List, Set
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple, Union
 
 from .calculator import calc_share, format_date, parse_date, round_float
 from .config import ThresholdConfig
+from .fact_index import FactIndex
+from .metrics import instrument_stage
+from .review_bitmap import ReviewBitmapIndex, popcount
 
 
-def _build_tag_lookup(dim_rows: Iterable[Dict]) -> Dict[str, str]:
+def _build_tag_lookup(dim_rows: Iterable[Dict]) -> Tuple[Dict[str, str], Dict[str, Tuple[str, str]]]:
+    """Tag names and tag -> (category_code, category_name_cn), read in one pass over return_dim_tag."""
     lookup: Dict[str, str] = {}
+    categories: Dict[str, Tuple[str, str]] = {}
     for row in dim_rows:
         code = row.get("tag_code")
         if not code:
@@ -16,11 +20,63 @@ def _build_tag_lookup(dim_rows: Iterable[Dict]) -> Dict[str, str]:
         if code not in lookup:
             name = row.get("tag_name_cn") or row.get("tag_name") or ""
             lookup[code] = str(name)
-    return lookup
+            if row.get("category_code"):
+                categories[code] = (str(row["category_code"]), str(row.get("category_name_cn") or ""))
+    return lookup, categories
+
+
+def _rollup_categories(
+    tag_bitmaps: Dict[str, int],
+    category_lookup: Dict[str, Tuple[str, str]],
+) -> Tuple[Dict[str, int], Dict[str, List[str]]]:
+    """Category review bitmaps as unions of their tags' bitmaps, plus the tags behind each."""
+    category_bitmaps: Dict[str, int] = {}
+    category_tags: Dict[str, List[str]] = {}
+    for tag_code, bitmap in tag_bitmaps.items():
+        category = category_lookup.get(tag_code)
+        if category is None:
+            continue
+        category_bitmaps[category[0]] = category_bitmaps.get(category[0], 0) | bitmap
+        category_tags.setdefault(category[0], []).append(tag_code)
+    for tag_codes in category_tags.values():
+        tag_codes.sort(key=lambda tag_code: popcount(tag_bitmaps[tag_code]), reverse=True)
+    return category_bitmaps, category_tags
+
+
+def _filter_indexed_facts(
+    index: FactIndex,
+    *,
+    country: str,
+    fasin: str,
+    asin_whitelist: Set[str],
+    start_date,
+    end_date,
+):
+    start = parse_date(start_date).toordinal()
+    end = parse_date(end_date).toordinal()
+    passed: List[int] = []
+    for asin in sorted(asin_whitelist):
+        for tag_code in index.tag_codes(asin):
+            for position, review_ordinal, row in index.facts(asin, tag_code):
+                if row.get("country") != country:
+                    continue
+                if row.get("fasin") != fasin:
+                    continue
+                if row.get("review_source") not in {0, 1, "0", "1"}:
+                    continue
+                if review_ordinal is None:
+                    # Unparseable dates fail exactly as they do on the row path.
+                    review_ordinal = parse_date(row.get("review_date")).toordinal()
+                if review_ordinal < start or review_ordinal > end:
+                    continue
+                passed.append(position)
+    # Back in fetch order: tags and reviews are interned in the order their first passing
+    # row was fetched, which is what breaks ties between equally frequent reasons.
+    yield from index.rows_at(passed)
 
 
 def _filter_fact_rows(
-    rows: Iterable[Dict],
+    rows: Union[Iterable[Dict], FactIndex],
     *,
     country: str,
     fasin: str,
@@ -28,6 +84,16 @@ def _filter_fact_rows(
     start_date,
     end_date,
 ):
+    if isinstance(rows, FactIndex):
+        yield from _filter_indexed_facts(
+            rows,
+            country=country,
+            fasin=fasin,
+            asin_whitelist=asin_whitelist,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        return
     start = parse_date(start_date)
     end = parse_date(end_date)
     for row in rows:
@@ -63,27 +129,30 @@ def _assess_confidence(
 
 def _select_core_reasons(
     *,
-    tag_counter: Dict[str, Set[str]],
+    tag_counter: Dict[str, int],
     sample_count: int,
-    tag_lookup: Dict[str, str],
+    describe: Callable[[str], Dict[str, Any]],
     thresholds: ThresholdConfig,
     can_deep_dive: bool,
 ) -> tuple[list[dict], float]:
     if sample_count == 0 or not tag_counter:
         return [], 0.0
-    ordered_tags = sorted(tag_counter.items(), key=lambda item: len(item[1]), reverse=True)
+    # tag_counter maps a tag (or category) -> review bitmap; its popcount is the distinct review count.
+    ordered_tags = sorted(
+        ((tag_code, popcount(bitmap)) for tag_code, bitmap in tag_counter.items()),
+        key=lambda item: item[1],
+        reverse=True,
+    )
     selected: List[Dict] = []
     cumulative = 0.0
     # For low-confidence ASINs we only surface the top 2 tags as reference issues.
     max_reasons = 2 if not can_deep_dive else thresholds.max_core_reasons
-    for idx, (tag_code, review_ids) in enumerate(ordered_tags):
-        event_count = len(review_ids)
+    for idx, (tag_code, event_count) in enumerate(ordered_tags):
         if event_count == 0:
             continue
         coverage = calc_share(event_count, sample_count)
         reason = {
-            "tag_code": tag_code,
-            "tag_name_cn": tag_lookup.get(tag_code, ""),
+            **describe(tag_code),
             "event_count": event_count,
             "event_coverage": round_float(coverage),
             "is_primary": idx == 0,
@@ -101,10 +170,11 @@ def _select_core_reasons(
     return selected, round_float(cumulative)
 
 
+@instrument_stage("problem_asin_reasons", rows_arg="fact_rows")
 def build_problem_reasons(
     *,
     asin_structure: Iterable[Dict],
-    fact_rows: Iterable[Dict],
+    fact_rows: Union[Iterable[Dict], FactIndex],
     tag_dimension: Iterable[Dict],
     thresholds: ThresholdConfig,
     country: str,
@@ -122,37 +192,33 @@ def build_problem_reasons(
     if not asin_whitelist:
         return []
 
-    tag_lookup = _build_tag_lookup(tag_dimension)
-    filtered_rows = list(
-        _filter_fact_rows(
-            fact_rows,
-            country=country,
-            fasin=fasin,
-            asin_whitelist=asin_whitelist,
-            start_date=start_fmt,
-            end_date=end_fmt,
-        )
-    )
-
-    asin_events: Dict[str, Dict[str, Set[str]]] = {}
-    for row in filtered_rows:
+    tag_lookup, category_lookup = _build_tag_lookup(tag_dimension)
+    asin_events: Dict[str, ReviewBitmapIndex] = {}
+    for row in _filter_fact_rows(
+        fact_rows,
+        country=country,
+        fasin=fasin,
+        asin_whitelist=asin_whitelist,
+        start_date=start_fmt,
+        end_date=end_fmt,
+    ):
         asin = row.get("asin")
         if asin not in asin_whitelist:
             continue
-        asin_bucket = asin_events.setdefault(asin, {"reviews": set(), "tags": defaultdict(set)})
         review_id = row.get("review_id")
         if review_id:
-            asin_bucket["reviews"].add(review_id)
+            asin_index = asin_events.get(asin)
+            if asin_index is None:
+                asin_index = asin_events[asin] = ReviewBitmapIndex()
             tag_code = row.get("tag_code")
-            if tag_code:
-                asin_bucket["tags"][tag_code].add(review_id)
-                if tag_code not in tag_lookup and row.get("tag_name_cn"):
-                    tag_lookup[tag_code] = row.get("tag_name_cn")
+            asin_index.add(review_id, tag_code)
+            if tag_code and tag_code not in tag_lookup and row.get("tag_name_cn"):
+                tag_lookup[tag_code] = row.get("tag_name_cn")
 
     results: List[Dict] = []
     for asin, asin_record in asin_lookup.items():
-        bucket = asin_events.get(asin, {"reviews": set(), "tags": defaultdict(set)})
-        sample_count = len(bucket["reviews"])
+        asin_index = asin_events.get(asin, ReviewBitmapIndex())
+        sample_count = asin_index.review_count
         units_returned = asin_record.get("units_returned", 0)
         text_coverage = calc_share(sample_count, units_returned)
         confidence = _assess_confidence(
@@ -160,10 +226,24 @@ def build_problem_reasons(
             text_coverage=text_coverage,
             thresholds=thresholds,
         )
+        tag_bitmaps = asin_index.tag_bitmaps()
         core_reasons, coverage_reached = _select_core_reasons(
-            tag_counter=bucket["tags"],
+            tag_counter=tag_bitmaps,
+            sample_count=sample_count,
+            describe=lambda tag_code: {"tag_code": tag_code, "tag_name_cn": tag_lookup.get(tag_code, "")},
+            thresholds=thresholds,
+            can_deep_dive=confidence["can_deep_dive_reasons"],
+        )
+        # Same bitmaps, rolled up: a review counts once per category however many of its tags match.
+        category_bitmaps, category_tags = _rollup_categories(tag_bitmaps, category_lookup)
+        core_categories, _ = _select_core_reasons(
+            tag_counter=category_bitmaps,
             sample_count=sample_count,
-            tag_lookup=tag_lookup,
+            describe=lambda category_code: {
+                "category_code": category_code,
+                "category_name_cn": category_lookup[category_tags[category_code][0]][1],
+                "tag_codes": category_tags[category_code],
+            },
             thresholds=thresholds,
             can_deep_dive=confidence["can_deep_dive_reasons"],
         )
@@ -179,6 +259,7 @@ def build_problem_reasons(
             "units_returned": int(units_returned),
             "text_coverage": round_float(text_coverage),
             "core_reasons": core_reasons,
+            "core_categories": core_categories,
             "coverage_threshold": thresholds.coverage_threshold,
             "coverage_reached": coverage_reached,
             **confidence,
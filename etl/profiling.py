@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import logging
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+LOGGER = logging.getLogger("etl.profiling")
+
+PROFILE_TOP_N = 30
+TRACEMALLOC_FRAMES = 1
+# Allocation sites inside the profilers themselves are noise in the report.
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+_ACTIVE: Optional["ProfileSession"] = None
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+class ProfileSession:
+    """
+    Profiles every stage of a run with cProfile and tracemalloc.
+
+    Each stage writes ``<prefix>_<nn>_<stage>.prof`` (load with pstats or snakeviz) and a
+    ``.txt`` report with the sorted call stats and the top allocation sites. Only one stage
+    is profiled at a time; a stage starting while another is profiled (a nested stage or a
+    fetch thread) runs unprofiled and shows up inside the outer stage instead.
+    """
+
+    def __init__(self, output_dir: Path, prefix: str) -> None:
+        self.directory = Path(output_dir) / "profile"
+        self.prefix = re.sub(r"[^A-Za-z0-9_.-]+", "_", prefix)
+        self.reports: List[Path] = []
+        self._busy = False
+        self._lock = threading.Lock()
+
+    def _claim(self) -> int:
+        with self._lock:
+            if self._busy:
+                return 0
+            self._busy = True
+            return len(self.reports) + 1
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[None]:
+        sequence = self._claim()
+        if not sequence:
+            yield
+            return
+        profiler = cProfile.Profile()
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+            try:
+                self._write(sequence, name, profiler, snapshot, elapsed, peak)
+            finally:
+                with self._lock:
+                    self._busy = False
+
+    def _write(
+        self,
+        sequence: int,
+        name: str,
+        profiler: cProfile.Profile,
+        snapshot: tracemalloc.Snapshot,
+        elapsed: float,
+        peak: int,
+    ) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = self.directory / f"{self.prefix}_{sequence:02d}_{name}"
+        profiler.dump_stats(str(stem.with_suffix(".prof")))
+
+        report = io.StringIO()
+        report.write(f"stage: {name}\nwall: {elapsed:.3f} s\ntraced peak: {_format_bytes(peak)}\n\n")
+        for sort_key in ("cumulative", "tottime"):
+            report.write(f"== cProfile by {sort_key} (top {PROFILE_TOP_N}) ==\n")
+            stats = pstats.Stats(profiler, stream=report)
+            stats.sort_stats(sort_key).print_stats(PROFILE_TOP_N)
+        report.write(f"== Live allocations made during the stage, by line (top {PROFILE_TOP_N}) ==\n")
+        for index, stat in enumerate(snapshot.statistics("lineno")[:PROFILE_TOP_N], 1):
+            frame = stat.traceback[0]
+            report.write(
+                f"{index:3d}. {frame.filename}:{frame.lineno}: {_format_bytes(stat.size)} in {stat.count} blocks\n"
+            )
+        report_path = stem.with_suffix(".txt")
+        report_path.write_text(report.getvalue(), encoding="utf-8")
+        self.reports.append(report_path)
+        LOGGER.info("Profile of %s (%.3f s, peak %s) written to %s", name, elapsed, _format_bytes(peak), report_path)
+
+
+def active_session() -> Optional[ProfileSession]:
+    return _ACTIVE
+
+
+@contextmanager
+def run_profile(enabled: bool, output_dir: Path, prefix: str) -> Iterator[Optional[ProfileSession]]:
+    """Profile the stages run inside the block into ``<output_dir>/profile``; a no-op when disabled."""
+    global _ACTIVE
+    if not enabled:
+        yield None
+        return
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    session = ProfileSession(output_dir, prefix)
+    previous, _ACTIVE = _ACTIVE, session
+    try:
+        yield session
+    finally:
+        _ACTIVE = previous
+        if started_tracing:
+            tracemalloc.stop()
+        LOGGER.info("Profiled %d stages into %s", len(session.reports), session.directory)
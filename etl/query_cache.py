@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .config import CacheConfig
+
+_TABLE_PATTERN = re.compile(r"\bFROM\s+([A-Za-z0-9_.]+)", re.IGNORECASE)
+
+
+def sql_table_name(sql: str) -> str:
+    match = _TABLE_PATTERN.search(sql)
+    return match.group(1).split(".")[-1] if match else ""
+
+
+def cache_key(sql: str, params: Sequence[Any], source: str = "") -> str:
+    # Every source runs the same SQL, so the source identity is part of the key.
+    raw = json.dumps([source, sql, list(params)], ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """
+    Two-level (memory + disk) cache of normalized query results keyed by source, SQL and
+    parameters.
+
+    Entries expire after the TTL configured for the queried table. Memory holds at most
+    ``max_memory_entries`` results and the disk directory at most ``max_disk_bytes``;
+    both evict the least recently used entries first.
+    """
+
+    def __init__(self, config: CacheConfig, directory: Path, source: str = "") -> None:
+        self.config = config
+        self.directory = Path(directory)
+        # Doris host/port/database or SQLite file the cached rows were read from.
+        self.source = source
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._memory: "OrderedDict[str, Tuple[float, str, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _ttl(self, table: str) -> int:
+        return int(self.config.ttl_seconds.get(table, self.config.default_ttl_seconds))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, sql: str, params: Sequence[Any]) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """Return ``(rows, is_stale)`` or ``None`` on a miss."""
+        key = cache_key(sql, params, self.source)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is None:
+            entry = self._load(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, table, rows = entry
+        age = time.time() - stored_at
+        ttl = self._ttl(table)
+        if age <= ttl:
+            is_stale = False
+        elif self.config.stale_while_revalidate and age <= ttl + self.config.max_stale_seconds:
+            is_stale = True
+        else:
+            self.misses += 1
+            return None
+        if is_stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        # Hand out copies so callers can mutate rows without corrupting the cache.
+        return [dict(row) for row in rows], is_stale
+
+    def put(self, sql: str, params: Sequence[Any], rows: List[Dict[str, Any]]) -> None:
+        key = cache_key(sql, params, self.source)
+        table = sql_table_name(sql)
+        stored_at = time.time()
+        entry = (stored_at, table, [dict(row) for row in rows])
+        self._remember(key, entry)
+
+        path = self._path(key)
+        # Thread idents repeat across processes, so the pid keeps side-by-side runs apart.
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as handle:
+                json.dump({"table": table, "stored_at": stored_at, "rows": rows}, handle, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        self._enforce_disk_limit()
+
+    def _remember(self, key: str, entry: Tuple[float, str, List[Dict[str, Any]]]) -> None:
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > max(self.config.max_memory_entries, 0):
+                self._memory.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[Tuple[float, str, List[Dict[str, Any]]]]:
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        entry = (float(payload.get("stored_at", 0.0)), str(payload.get("table", "")), payload.get("rows", []))
+        try:
+            os.utime(path)  # mtime doubles as the LRU clock for disk eviction
+        except OSError:
+            pass
+        self._remember(key, entry)
+        return entry
+
+    def _enforce_disk_limit(self) -> None:
+        files = []
+        total = 0
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.config.max_disk_bytes:
+            return
+        for _, size, path in sorted(files):
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            if total <= self.config.max_disk_bytes:
+                break
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        for path in self.directory.glob("*.json"):
+            try:
+                path.unlink()
+            except OSError:
+                continue
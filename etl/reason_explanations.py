@@ -1,9 +1,24 @@
 from __future__ import annotations
 
+import heapq
 from datetime import date
-from typing import Any, Dict, Iterable, List, Optional, Set
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 from .calculator import parse_date
+from .fact_index import FactIndex
+from .metrics import instrument_stage
+
+# rows: one fact row per (review, tag) as fetched. normalized: review text stored once per
+# review_id plus a (asin, tag_code, review_id) edge list.
+EXPLANATION_LAYOUTS = ("rows", "normalized")
+EXPLANATION_TABLES = {
+    "rows": ("reason_explanations",),
+    "normalized": ("reason_explanation_reviews", "reason_explanation_edges"),
+}
+# Per-tag columns of view_return_fact_details; everything else describes the review itself.
+EDGE_FIELDS = ("asin", "tag_code", "review_id", "evidence")
+# Determined by tag_code (see core_reasons and return_dim_tag), so the normalized layout drops it.
+TAG_NAME_FIELD = "tag_name_cn"
 
 
 def _unwrap_problem_rows(raw: object) -> List[Dict[str, Any]]:
@@ -15,11 +30,11 @@ def _unwrap_problem_rows(raw: object) -> List[Dict[str, Any]]:
     return []
 
 
-def _unwrap_fact_rows(raw: object) -> List[Dict[str, Any]]:
+def _unwrap_fact_rows(raw: object) -> Iterable[Dict[str, Any]]:
     if isinstance(raw, dict):
         payload = raw.get("view_return_fact_details")
-        return list(payload) if isinstance(payload, list) else []
-    if isinstance(raw, list):
+        return payload if isinstance(payload, list) else []
+    if isinstance(raw, (list, Iterator)):
         return raw
     return []
 
@@ -59,6 +74,12 @@ def _build_asin_filters(problem_rows: Iterable[Dict[str, Any]]) -> Dict[str, Dic
     return asin_filters
 
 
+def core_reason_pairs(problem_reasons: object) -> List[Tuple[str, str]]:
+    """(asin, tag_code) pairs whose fact rows build_reason_explanations will keep."""
+    asin_filters = _build_asin_filters(_unwrap_problem_rows(problem_reasons))
+    return [(asin, tag_code) for asin, filters in asin_filters.items() for tag_code in sorted(filters["tags"])]
+
+
 def _in_range(review_date: Any, start_date: Optional[date], end_date: Optional[date]) -> bool:
     if start_date is None and end_date is None:
         return True
@@ -72,18 +93,112 @@ def _in_range(review_date: Any, start_date: Optional[date], end_date: Optional[d
     return True
 
 
-def build_reason_explanations(*, problem_reasons: object, fact_rows: object) -> List[Dict[str, Any]]:
+def _sentiment_value(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class EvidenceSampler:
+    """
+    Best ``limit`` fact rows per (asin, tag_code), chosen while the rows stream past.
+
+    Rows rank by review day (most recent first), then sentiment (most negative first), then
+    ``evidence`` length (longest first), then fetch order. Each reason keeps a min-heap of at
+    most ``limit`` entries whose root is the weakest kept row, so a candidate costs one
+    comparison once the heap is full and the whole candidate list never exists.
+    """
+
+    __slots__ = ("limit", "_heaps")
+
+    def __init__(self, limit: int) -> None:
+        if limit <= 0:
+            raise ValueError("EvidenceSampler needs a positive limit")
+        self.limit = limit
+        self._heaps: Dict[Tuple[str, str], List[Tuple[Tuple[int, float, int, int], int, Dict[str, Any]]]] = {}
+
+    def offer(self, key: Tuple[str, str], sequence: int, review_ordinal: Optional[int], row: Dict[str, Any]) -> None:
+        # Unparseable dates rank as the oldest; -sequence makes every rank unique.
+        day = review_ordinal if review_ordinal is not None else -1
+        heap = self._heaps.get(key)
+        if heap is None:
+            heap = self._heaps[key] = []
+        elif len(heap) >= self.limit and day < heap[0][0][0]:
+            # Older than every kept row: rejected without building its rank.
+            return
+        rank = (day, -_sentiment_value(row.get("sentiment")), len(row.get("evidence") or ""), -sequence)
+        if len(heap) < self.limit:
+            heapq.heappush(heap, (rank, sequence, row))
+        elif rank > heap[0][0]:
+            heapq.heapreplace(heap, (rank, sequence, row))
+
+    def sequences(self) -> List[int]:
+        return [sequence for heap in self._heaps.values() for _, sequence, _ in heap]
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Kept rows of every reason, back in fetch order."""
+        kept = [(sequence, row) for heap in self._heaps.values() for _, sequence, row in heap]
+        kept.sort(key=lambda item: item[0])
+        return [row for _, row in kept]
+
+
+def _select_indexed_facts(
+    index: FactIndex,
+    asin_filters: Dict[str, Dict[str, Any]],
+    sampler: Optional[EvidenceSampler] = None,
+) -> List[Dict[str, Any]]:
+    """Same filter as the row scan, visiting only the (asin, tag_code) groups of the core reasons."""
+    selected: List[int] = []
+    for asin, filters in asin_filters.items():
+        country, fasin = filters.get("country"), filters.get("fasin")
+        start = filters["start_date"].toordinal() if filters.get("start_date") else None
+        end = filters["end_date"].toordinal() if filters.get("end_date") else None
+        for tag_code in filters["tags"]:
+            for position, review_ordinal, row in index.facts(asin, tag_code):
+                if country and row.get("country") and row["country"] != country:
+                    continue
+                if fasin and row.get("fasin") and row["fasin"] != fasin:
+                    continue
+                # Unparseable dates are kept, as in _in_range.
+                if review_ordinal is not None and (
+                    (start is not None and review_ordinal < start) or (end is not None and review_ordinal > end)
+                ):
+                    continue
+                if sampler is None:
+                    selected.append(position)
+                else:
+                    sampler.offer((asin, tag_code), position, review_ordinal, row)
+    return index.rows_at(selected if sampler is None else sampler.sequences())
+
+
+@instrument_stage("reason_explanations", rows_arg="fact_rows")
+def build_reason_explanations(
+    *,
+    problem_reasons: object,
+    fact_rows: object,
+    max_evidence_per_reason: int = 0,
+) -> List[Dict[str, Any]]:
     """
     Filter view_return_fact_details rows by ASIN + tag_code derived from problem_asin_reasons.
+
+    ``fact_rows`` may be a lazy iterator; it is consumed in a single pass. A ``FactIndex``
+    is read by key instead, so the cost follows the selected rows; rows keep fetch order.
+
+    A positive ``max_evidence_per_reason`` keeps only that many rows per (asin, tag_code),
+    ranked by ``EvidenceSampler``; ``event_count`` in problem_asin_reasons still counts all
+    reviews of the reason.
     """
     problem_rows = _unwrap_problem_rows(problem_reasons)
-    fact_rows_list = _unwrap_fact_rows(fact_rows)
     asin_filters = _build_asin_filters(problem_rows)
-    if not asin_filters or not fact_rows_list:
+    if not asin_filters:
         return []
+    sampler = EvidenceSampler(max_evidence_per_reason) if max_evidence_per_reason > 0 else None
+    if isinstance(fact_rows, FactIndex):
+        return _select_indexed_facts(fact_rows, asin_filters, sampler)
 
     filtered: List[Dict[str, Any]] = []
-    for row in fact_rows_list:
+    for sequence, row in enumerate(_unwrap_fact_rows(fact_rows)):
         asin = row.get("asin")
         tag_code = row.get("tag_code")
         if not asin or asin not in asin_filters or not tag_code:
@@ -97,5 +212,89 @@ def build_reason_explanations(*, problem_reasons: object, fact_rows: object) ->
             continue
         if not _in_range(row.get("review_date"), filters.get("start_date"), filters.get("end_date")):
             continue
-        filtered.append(row)
-    return filtered
+        if sampler is None:
+            filtered.append(row)
+        else:
+            review_date = _parse_optional_date(row.get("review_date"))
+            sampler.offer((asin, tag_code), sequence, review_date.toordinal() if review_date else None, row)
+    return filtered if sampler is None else sampler.rows()
+
+
+def normalize_reason_explanations(rows: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Split explanation rows into ``reason_explanation_reviews`` (one row per review_id, first
+    seen values) and ``reason_explanation_edges`` (``EDGE_FIELDS`` per row, fetch order).
+
+    A review column whose value differs from the review's first row is kept on that edge,
+    and ``tag_name_cn`` is left out, so ``denormalize_reason_explanations`` with the tag
+    names gives back the original rows.
+    """
+    reviews: Dict[Any, Dict[str, Any]] = {}
+    edges: List[Dict[str, Any]] = []
+    for row in rows:
+        edge = {field: row.get(field) for field in EDGE_FIELDS}
+        review = reviews.get(edge["review_id"])
+        if review is None:
+            reviews[edge["review_id"]] = {
+                "review_id": edge["review_id"],
+                **{
+                    key: value
+                    for key, value in row.items()
+                    if key not in EDGE_FIELDS and key != TAG_NAME_FIELD
+                },
+            }
+        else:
+            for key, value in row.items():
+                if key not in EDGE_FIELDS and key != TAG_NAME_FIELD and review.get(key) != value:
+                    edge[key] = value
+        edges.append(edge)
+    return {"reason_explanation_reviews": list(reviews.values()), "reason_explanation_edges": edges}
+
+
+def tag_names_from_reasons(problem_reasons: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """tag_code -> tag_name_cn of the core reasons in problem ASIN reason rows."""
+    return {
+        reason.get("tag_code"): reason.get(TAG_NAME_FIELD)
+        for row in problem_reasons
+        for reason in row.get("core_reasons") or []
+    }
+
+
+def denormalize_reason_explanations(
+    reviews: Iterable[Dict[str, Any]],
+    edges: Iterable[Dict[str, Any]],
+    tag_names: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rebuild fact rows from the normalized tables; edge values win over review values.
+
+    ``tag_names`` maps tag_code to tag_name_cn (``tag_names_from_reasons`` or return_dim_tag);
+    without it the rows come back without ``tag_name_cn``.
+    """
+    by_id = {review.get("review_id"): review for review in reviews}
+    rows = []
+    for edge in edges:
+        row = {**by_id.get(edge.get("review_id"), {}), **edge}
+        if tag_names is not None:
+            row[TAG_NAME_FIELD] = tag_names.get(edge.get("tag_code"))
+        rows.append(row)
+    return rows
+
+
+def explanation_tables(rows: List[Dict[str, Any]], layout: str = "rows") -> Dict[str, List[Dict[str, Any]]]:
+    """Output tables holding the explanation rows in ``layout``."""
+    if layout == "rows":
+        return {"reason_explanations": rows}
+    if layout == "normalized":
+        return normalize_reason_explanations(rows)
+    raise ValueError(f"Unknown explanation layout {layout!r}; expected one of {', '.join(EXPLANATION_LAYOUTS)}")
+
+
+def stale_explanation_tables(layout: str) -> List[str]:
+    """Explanation tables of the other layouts, removed when writing ``layout`` so only one is on disk."""
+    return [
+        table_name
+        for other, table_names in EXPLANATION_TABLES.items()
+        if other != layout
+        for table_name in table_names
+    ]
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Optional
+
+from .snapshot_frame import np
+
+# Below this many positions a plain loop beats the NumPy call overhead.
+_NUMPY_MIN_POSITIONS = 256
+
+
+def popcount(bitmap: int) -> int:
+    """Number of set bits, i.e. distinct reviews in a review bitmap."""
+    if bitmap < 0:
+        raise ValueError("Review bitmaps are non-negative")
+    return bitmap.bit_count() if hasattr(bitmap, "bit_count") else bin(bitmap).count("1")
+
+
+def bitmap_from_positions(positions: array, size: int) -> int:
+    """Python int bitset with bit ``p`` set for every position ``p < size``; duplicates collapse."""
+    if not positions:
+        return 0
+    if np is not None and len(positions) >= _NUMPY_MIN_POSITIONS:
+        bits = np.zeros(size, dtype=np.uint8)
+        bits[np.frombuffer(positions, dtype=np.uintc)] = 1
+        return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+    buffer = bytearray((size + 7) >> 3)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+class ReviewBitmapIndex:
+    """
+    Distinct reviews of one ASIN and which tags they carry.
+
+    Review IDs are interned to dense integers in first-seen order, so the ASIN's sample
+    count is the size of the intern table and every tag is a bitmap over those integers.
+    Rows only append a position per tag while scanning; the bitmaps are built once at the
+    end, so distinct counts are popcounts and tags combine with ``|`` / ``&``.
+    """
+
+    __slots__ = ("_review_ids", "_tag_positions")
+
+    def __init__(self) -> None:
+        self._review_ids: Dict[str, int] = {}
+        self._tag_positions: Dict[str, array] = {}
+
+    def add(self, review_id: str, tag_code: Optional[str] = None) -> int:
+        position = self._review_ids.get(review_id)
+        if position is None:
+            position = self._review_ids[review_id] = len(self._review_ids)
+        if tag_code:
+            positions = self._tag_positions.get(tag_code)
+            if positions is None:
+                positions = self._tag_positions[tag_code] = array("I")
+            positions.append(position)
+        return position
+
+    @property
+    def review_count(self) -> int:
+        return len(self._review_ids)
+
+    def tag_bitmaps(self) -> Dict[str, int]:
+        """Tag code -> review bitmap, in first-seen tag order."""
+        size = len(self._review_ids)
+        return {tag_code: bitmap_from_positions(positions, size) for tag_code, positions in self._tag_positions.items()}
@@ -3,10 +3,16 @@
 import logging
 from typing import Dict, List
 
-from .asin_structure import build_asin_structure
-from .cli_utils import build_stage_parser, format_window, resolve_runtime
-from .doris_client import DorisClient
-from .parent_summary import calculate_parent_summary
+from .cli_utils import (
+    build_stage_artifacts,
+    build_stage_parser,
+    collect_input_digests,
+    format_window,
+    resolve_runtime,
+    stage_instrumentation,
+)
+from .data_source import create_client
+from .pipeline import compute_snapshot_stages
 
 LOGGER = logging.getLogger("etl.run_asin_structure")
 
@@ -22,30 +28,36 @@ def run(args=None) -> List[Dict[str, object]]:
     start_str, end_str = format_window(start_date, end_date)
     LOGGER.info("ASIN structure window: %s ~ %s", start_str, end_str)
 
-    with DorisClient(config.database, config.paths) as client:
-        snapshot_rows = client.fetch_view_return_snapshot(
+    aggregated = parsed_args.snapshot_mode == "aggregated"
+    artifacts = build_stage_artifacts(parsed_args, config, start_date, end_date)
+    with stage_instrumentation(parsed_args, config, "run_asin_structure"), create_client(config) as client:
+        snapshot_rows = client.fetch_snapshot(
+            mode=parsed_args.snapshot_mode,
             country=parsed_args.country,
             fasin=parsed_args.fasin,
             start_date=start_str,
             end_date=end_str,
+            lookback_days=parsed_args.lookback_days,
         )
-        parent_summary = calculate_parent_summary(
-            snapshot_rows,
+        _, asin_structure = compute_snapshot_stages(
+            snapshot_rows=snapshot_rows,
+            thresholds=config.thresholds,
             country=parsed_args.country,
             fasin=parsed_args.fasin,
             start_date=start_date,
             end_date=end_date,
+            aggregated_snapshot=aggregated,
+            artifacts=artifacts,
+            input_digests=collect_input_digests(client, parsed_args),
         )
-        asin_structure = build_asin_structure(
-            snapshot_rows,
+        output_path = client.write_output(
+            "asin_structure",
+            asin_structure,
             country=parsed_args.country,
             fasin=parsed_args.fasin,
-            start_date=start_date,
-            end_date=end_date,
-            parent_summary=parent_summary,
-            thresholds=config.thresholds,
+            start_date=start_str,
+            end_date=end_str,
         )
-        output_path = client.write_json("asin_structure", asin_structure)
         LOGGER.info("asin_structure written to %s", output_path)
     return asin_structure
 
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .cli_utils import build_stage_parser, format_window, resolve_runtime, stage_instrumentation
+from .data_source import create_client
+from .doris_client import DorisClient
+from .metrics import active_recorder, collect_events
+from .pipeline import compute_parent_outputs, output_tables
+from .profiling import run_profile
+from .reason_explanations import stale_explanation_tables
+
+LOGGER = logging.getLogger("etl.run_batch")
+
+DEFAULT_CHUNK_SIZE = 200
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = build_stage_parser("Run the ETL pipeline for many parent ASINs in one invocation")
+    parser.add_argument("--fasins", help="Comma separated parent ASINs (uses --country)")
+    parser.add_argument(
+        "--fasin-file",
+        help="Text file with one parent per line, either FASIN or COUNTRY,FASIN ('#' starts a comment)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Parents per grouped fasin IN (...) query (defaults to {DEFAULT_CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for the compute stages (1 runs inline)",
+    )
+    return parser.parse_args(argv)
+
+
+def _read_fasin_file(path: Path, default_country: str | None) -> List[Tuple[str, str]]:
+    targets: List[Tuple[str, str]] = []
+    with path.open("r", encoding="utf-8-sig") as handle:
+        for raw_line in handle:
+            line = raw_line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = [part.strip() for part in line.replace("\t", ",").split(",") if part.strip()]
+            if len(parts) >= 2:
+                targets.append((parts[0], parts[1]))
+            elif default_country:
+                targets.append((default_country, parts[0]))
+            else:
+                raise ValueError(f"No country for parent {parts[0]} in {path}; pass --country or use COUNTRY,FASIN")
+    return targets
+
+
+def resolve_targets(args: argparse.Namespace) -> Dict[str, List[str]]:
+    """Collect the requested parents grouped by country, keeping first-seen order."""
+    targets: List[Tuple[str, str]] = []
+    if args.fasin_file:
+        targets.extend(_read_fasin_file(Path(args.fasin_file), args.country))
+    if args.fasins:
+        if not args.country:
+            raise ValueError("--country is required together with --fasins")
+        targets.extend((args.country, fasin.strip()) for fasin in args.fasins.split(",") if fasin.strip())
+    if not targets and args.country and args.fasin:
+        targets.append((args.country, args.fasin))
+    if not targets:
+        raise ValueError("No parent ASINs given; use --fasins, --fasin-file or the params file")
+
+    grouped: Dict[str, List[str]] = {}
+    for country, fasin in targets:
+        fasins = grouped.setdefault(country, [])
+        if fasin not in fasins:
+            fasins.append(fasin)
+    return grouped
+
+
+def _chunks(items: List[str], size: int) -> List[List[str]]:
+    size = max(size, 1)
+    return [items[idx : idx + size] for idx in range(0, len(items), size)]
+
+
+def _write_outputs(
+    client: DorisClient,
+    country: str,
+    fasin: str,
+    outputs: Dict[str, object],
+    *,
+    window: Tuple[str, str],
+    explanation_layout: str = "rows",
+) -> None:
+    for table_name, payload in output_tables(outputs, explanation_layout).items():
+        client.write_output(
+            table_name,
+            payload,
+            country=country,
+            fasin=fasin,
+            start_date=window[0],
+            end_date=window[1],
+            subdir=Path(country) / fasin,
+        )
+    for table_name in stale_explanation_tables(explanation_layout):
+        client.remove_output(
+            table_name,
+            country=country,
+            fasin=fasin,
+            start_date=window[0],
+            end_date=window[1],
+            subdir=Path(country) / fasin,
+        )
+    LOGGER.info("Wrote outputs for %s/%s", country, fasin)
+
+
+def _compute_parent(
+    job: Dict[str, object],
+    collect_metrics: bool,
+    profile_dir: Optional[Path] = None,
+) -> Tuple[Dict[str, object], List[Dict]]:
+    # Worker processes have no recorder or profiler of their own: stage events travel back
+    # with the outputs and profiles are written by the worker, one prefix per parent.
+    with run_profile(profile_dir is not None, profile_dir or Path(), f"{job['country']}_{job['fasin']}"):
+        if collect_metrics:
+            return collect_events(compute_parent_outputs, **job)
+        return compute_parent_outputs(**job), []
+
+
+def _drain(
+    pending: List[Tuple[str, str, Future]],
+    client: DorisClient,
+    status: Dict[str, str],
+    *,
+    window: Tuple[str, str],
+    explanation_layout: str = "rows",
+) -> None:
+    recorder = active_recorder()
+    for country, fasin, future in pending:
+        key = f"{country}/{fasin}"
+        try:
+            outputs, events = future.result()
+            if recorder is not None:
+                for event in events:
+                    recorder.add({**event, "country": country, "fasin": fasin})
+            _write_outputs(client, country, fasin, outputs, window=window, explanation_layout=explanation_layout)
+            status[key] = "ok"
+        except Exception:  # noqa: BLE001 - one bad parent must not abort the batch
+            LOGGER.exception("Failed to compute %s", key)
+            status[key] = "failed"
+    pending.clear()
+
+
+def run(args: List[str] | None = None) -> Dict[str, str]:
+    parsed_args = parse_args(args)
+    logging.basicConfig(
+        level=getattr(logging, (parsed_args.log_level or "INFO").upper(), logging.INFO),
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    config, start_date, end_date = resolve_runtime(parsed_args, require_target=False)
+    start_str, end_str = format_window(start_date, end_date)
+    targets = resolve_targets(parsed_args)
+    LOGGER.info(
+        "Batch window %s ~ %s for %d parents",
+        start_str,
+        end_str,
+        sum(len(fasins) for fasins in targets.values()),
+    )
+
+    if parsed_args.two_phase_facts or parsed_args.stream:
+        LOGGER.warning("--two-phase-facts/--stream are single-parent options and are ignored in batch mode")
+    aggregated = parsed_args.snapshot_mode == "aggregated"
+    profile_dir = config.paths.output_dir if parsed_args.profile else None
+    status: Dict[str, str] = {}
+    executor = ProcessPoolExecutor(max_workers=parsed_args.workers) if parsed_args.workers > 1 else None
+    try:
+        with stage_instrumentation(parsed_args, config, "run_batch"), create_client(config) as client:
+            fetch_snapshot = (
+                client.fetch_view_return_snapshot_agg_batch
+                if aggregated
+                else client.fetch_view_return_snapshot_batch
+            )
+            tag_dim = client.fetch_return_dim_tag()
+            pending: List[Tuple[str, str, Future]] = []
+            for country, fasins in targets.items():
+                for chunk in _chunks(fasins, parsed_args.chunk_size):
+                    if parsed_args.snapshot_mode == "incremental":
+                        # The local store only needs the missing days, so per-parent syncs stay small.
+                        snapshot_by_fasin = {
+                            fasin: client.sync_view_return_snapshot(
+                                country=country,
+                                fasin=fasin,
+                                start_date=start_str,
+                                end_date=end_str,
+                                lookback_days=parsed_args.lookback_days,
+                                dump_dir=client.data_dir / country / fasin,
+                            )
+                            for fasin in chunk
+                        }
+                    else:
+                        snapshot_by_fasin = fetch_snapshot(
+                            country=country,
+                            fasins=chunk,
+                            start_date=start_str,
+                            end_date=end_str,
+                        )
+                    fact_by_fasin = client.fetch_view_return_fact_details_batch(
+                        country=country,
+                        fasins=chunk,
+                        start_date=start_str,
+                        end_date=end_str,
+                    )
+                    LOGGER.info("Fetched %d parents for %s", len(chunk), country)
+                    # Results of the previous chunk are written while this chunk computes.
+                    previous, pending = pending, []
+                    for fasin in chunk:
+                        job = dict(
+                            snapshot_rows=snapshot_by_fasin.get(fasin, []),
+                            fact_rows=fact_by_fasin.get(fasin, []),
+                            tag_dim=tag_dim,
+                            thresholds=config.thresholds,
+                            country=country,
+                            fasin=fasin,
+                            start_date=start_date,
+                            end_date=end_date,
+                            aggregated_snapshot=aggregated,
+                            max_evidence_per_reason=config.max_evidence_per_reason,
+                        )
+                        if executor is None:
+                            future: Future = Future()
+                            try:
+                                future.set_result(_compute_parent(job, parsed_args.metrics, profile_dir))
+                            except Exception as exc:  # noqa: BLE001 - surfaced in _drain
+                                future.set_exception(exc)
+                        else:
+                            future = executor.submit(_compute_parent, job, parsed_args.metrics, profile_dir)
+                        pending.append((country, fasin, future))
+                    _drain(
+                        previous,
+                        client,
+                        status,
+                        window=(start_str, end_str),
+                        explanation_layout=config.paths.explanation_layout,
+                    )
+            _drain(
+                pending,
+                client,
+                status,
+                window=(start_str, end_str),
+                explanation_layout=config.paths.explanation_layout,
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    failed = [key for key, value in status.items() if value != "ok"]
+    LOGGER.info("Batch finished: %d ok, %d failed", len(status) - len(failed), len(failed))
+    return status
+
+
+def main() -> None:
+    run()
+
+
+if __name__ == "__main__":
+    main()
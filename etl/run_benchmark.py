@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .benchmark import DEFAULT_TOLERANCE, benchmark_stages, compare_with_baseline, fact_index_parity_report
+from .cli_utils import add_synthetic_arguments, resolve_synthetic_spec
+from .config import BASE_DIR, build_config
+from .synthetic_data import generate_datasets
+
+LOGGER = logging.getLogger("etl.run_benchmark")
+
+DEFAULT_BASELINE_DIR = BASE_DIR / "benchmarks"
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser("Benchmark the compute stages on seeded synthetic data")
+    add_synthetic_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed rounds per stage (median is compared)")
+    parser.add_argument(
+        "--baseline",
+        help=f"Baseline report to compare with (defaults to {DEFAULT_BASELINE_DIR}/baseline_<scale>.json)",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store this run as the baseline instead of comparing against it",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Allowed relative slow-down of the median wall time (defaults to {DEFAULT_TOLERANCE})",
+    )
+    parser.add_argument("--output-dir", help="Directory for benchmark_report.json (defaults to template/output)")
+    parser.add_argument("--env-file", help="Environment config file (YAML) providing the thresholds")
+    parser.add_argument("--log-level", default="INFO", help="Logging level")
+    return parser.parse_args(argv)
+
+
+def _write_json(path: Path, payload: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def run(args: List[str] | None = None) -> Dict[str, Any]:
+    parsed_args = parse_args(args)
+    logging.basicConfig(
+        level=getattr(logging, (parsed_args.log_level or "INFO").upper(), logging.INFO),
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    config = build_config(
+        output_dir=Path(parsed_args.output_dir).resolve() if parsed_args.output_dir else None,
+        environment_path=Path(parsed_args.env_file).resolve() if parsed_args.env_file else None,
+    )
+    spec = resolve_synthetic_spec(parsed_args)
+    baseline_path = (
+        Path(parsed_args.baseline).resolve()
+        if parsed_args.baseline
+        else DEFAULT_BASELINE_DIR / f"baseline_{parsed_args.scale}.json"
+    )
+
+    started = time.perf_counter()
+    datasets = generate_datasets(spec)
+    LOGGER.info(
+        "Generated %s in %.1fs",
+        ", ".join(f"{len(rows)} {table_name} rows" for table_name, rows in datasets.items()),
+        time.perf_counter() - started,
+    )
+    report = benchmark_stages(datasets, spec, thresholds=config.thresholds, repeat=parsed_args.repeat)
+    # Kept out of the baseline comparison: a parity failure is wrong output, not a slow-down.
+    report["fact_index_parity"] = fact_index_parity_report(datasets, spec, thresholds=config.thresholds)
+    for mismatch in report["fact_index_parity"]["mismatches"]:
+        LOGGER.error(
+            "Row and FactIndex paths disagree on %s for seed %s",
+            ", ".join(mismatch["checks"]),
+            mismatch["spec"]["seed"],
+        )
+
+    if parsed_args.save_baseline:
+        _write_json(baseline_path, report)
+        LOGGER.info("Baseline saved to %s", baseline_path)
+    elif baseline_path.exists():
+        with baseline_path.open("r", encoding="utf-8-sig") as handle:
+            report["comparison"] = compare_with_baseline(
+                report,
+                json.load(handle),
+                tolerance=parsed_args.tolerance,
+            )
+    else:
+        LOGGER.warning(
+            "No baseline at %s, nothing compared; record one with --save-baseline on the reference commit first",
+            baseline_path,
+        )
+
+    comparison = report.get("comparison", {}).get("stages", {})
+    for stage, result in report["stages"].items():
+        verdict = comparison.get(stage)
+        LOGGER.info(
+            "%-20s median %8.3fs  min %8.3fs  cpu %8.3fs%s",
+            stage,
+            result["wall_seconds_median"],
+            result["wall_seconds_min"],
+            result["cpu_seconds_median"],
+            f"  {verdict['status']} (x{verdict.get('ratio', 1.0)} of baseline)" if verdict else "",
+        )
+    report_path = config.paths.output_dir / "benchmark_report.json"
+    _write_json(report_path, report)
+    LOGGER.info("Benchmark report written to %s", report_path)
+    return report
+
+
+def main() -> None:
+    report = run()
+    if not report.get("comparison", {}).get("ok", True) or not report["fact_index_parity"]["ok"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
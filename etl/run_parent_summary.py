@@ -3,8 +3,15 @@
 import logging
 from typing import Dict
 
-from .cli_utils import build_stage_parser, format_window, resolve_runtime
-from .doris_client import DorisClient
+from .cli_utils import (
+    build_stage_artifacts,
+    build_stage_parser,
+    collect_input_digests,
+    format_window,
+    resolve_runtime,
+    stage_instrumentation,
+)
+from .data_source import create_client
 from .parent_summary import calculate_parent_summary
 
 LOGGER = logging.getLogger("etl.run_parent_summary")
@@ -21,21 +28,38 @@ def run(args=None) -> Dict[str, object]:
     start_str, end_str = format_window(start_date, end_date)
     LOGGER.info("Parent summary window: %s ~ %s", start_str, end_str)
 
-    with DorisClient(config.database, config.paths) as client:
-        snapshot_rows = client.fetch_view_return_snapshot(
+    aggregated = parsed_args.snapshot_mode == "aggregated"
+    with stage_instrumentation(parsed_args, config, "run_parent_summary"), create_client(config) as client:
+        snapshot_rows = client.fetch_snapshot(
+            mode=parsed_args.snapshot_mode,
             country=parsed_args.country,
             fasin=parsed_args.fasin,
             start_date=start_str,
             end_date=end_str,
+            lookback_days=parsed_args.lookback_days,
         )
-        summary = calculate_parent_summary(
-            snapshot_rows,
+        artifacts = build_stage_artifacts(parsed_args, config, start_date, end_date)
+        digests = collect_input_digests(client, parsed_args)
+        summary = artifacts.get_or_compute(
+            "parent_summary",
+            {"snapshot": digests["snapshot"]},
+            lambda: calculate_parent_summary(
+                snapshot_rows,
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_date,
+                end_date=end_date,
+                aggregated=aggregated,
+            ),
+        )
+        output_path = client.write_output(
+            "parent_summary",
+            summary,
             country=parsed_args.country,
             fasin=parsed_args.fasin,
-            start_date=start_date,
-            end_date=end_date,
+            start_date=start_str,
+            end_date=end_str,
         )
-        output_path = client.write_json("parent_summary", summary)
         LOGGER.info("parent_summary written to %s", output_path)
     return summary
 
@@ -3,12 +3,22 @@
 import logging
 from typing import Dict, List
 
-from .asin_structure import build_asin_structure
-from .cli_utils import build_stage_parser, format_window, resolve_runtime
-from .doris_client import DorisClient
-from .parent_summary import calculate_parent_summary
-from .problem_reasons import build_problem_reasons
-from .reason_explanations import build_reason_explanations
+from .cli_utils import (
+    build_stage_artifacts,
+    build_stage_parser,
+    collect_input_digests,
+    format_window,
+    resolve_runtime,
+    stage_instrumentation,
+)
+from .data_source import create_client
+from .pipeline import compute_problem_reasons, compute_snapshot_stages
+from .reason_explanations import (
+    build_reason_explanations,
+    core_reason_pairs,
+    explanation_tables,
+    stale_explanation_tables,
+)
 
 LOGGER = logging.getLogger("etl.run_problem_reasons")
 
@@ -24,54 +34,112 @@ def run(args=None) -> List[Dict[str, object]]:
     start_str, end_str = format_window(start_date, end_date)
     LOGGER.info("Problem reasons window: %s ~ %s", start_str, end_str)
 
-    with DorisClient(config.database, config.paths) as client:
-        snapshot_rows = client.fetch_view_return_snapshot(
+    aggregated = parsed_args.snapshot_mode == "aggregated"
+    artifacts = build_stage_artifacts(parsed_args, config, start_date, end_date)
+    with stage_instrumentation(parsed_args, config, "run_problem_reasons"), create_client(config) as client:
+        snapshot_rows = client.fetch_snapshot(
+            mode=parsed_args.snapshot_mode,
             country=parsed_args.country,
             fasin=parsed_args.fasin,
             start_date=start_str,
             end_date=end_str,
+            lookback_days=parsed_args.lookback_days,
         )
-        parent_summary = calculate_parent_summary(
-            snapshot_rows,
+        _, asin_structure = compute_snapshot_stages(
+            snapshot_rows=snapshot_rows,
+            thresholds=config.thresholds,
             country=parsed_args.country,
             fasin=parsed_args.fasin,
             start_date=start_date,
             end_date=end_date,
+            aggregated_snapshot=aggregated,
+            artifacts=artifacts,
+            input_digests=collect_input_digests(client, parsed_args),
         )
-        asin_structure = build_asin_structure(
-            snapshot_rows,
+        if parsed_args.two_phase_facts:
+            fact_rows = client.fetch_view_return_fact_tags(
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_str,
+                end_date=end_str,
+                stream=parsed_args.stream,
+            )
+        else:
+            fetch_facts = (
+                client.stream_view_return_fact_details
+                if parsed_args.stream
+                else client.fetch_view_return_fact_details
+            )
+            fact_rows = fetch_facts(
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_str,
+                end_date=end_str,
+            )
+        tag_dim = client.fetch_return_dim_tag()
+        problem_reasons = compute_problem_reasons(
+            asin_structure=asin_structure,
+            fact_rows=fact_rows,
+            tag_dim=tag_dim,
+            thresholds=config.thresholds,
             country=parsed_args.country,
             fasin=parsed_args.fasin,
             start_date=start_date,
             end_date=end_date,
-            parent_summary=parent_summary,
-            thresholds=config.thresholds,
+            artifacts=artifacts,
+            input_digests=collect_input_digests(client, parsed_args),
         )
-        fact_rows = client.fetch_view_return_fact_details(
+        output_path = client.write_output(
+            "problem_asin_reasons",
+            problem_reasons,
             country=parsed_args.country,
             fasin=parsed_args.fasin,
             start_date=start_str,
             end_date=end_str,
         )
-        tag_dim = client.fetch_return_dim_tag()
-        problem_reasons = build_problem_reasons(
-            asin_structure=asin_structure,
-            fact_rows=fact_rows,
-            tag_dimension=tag_dim,
-            thresholds=config.thresholds,
-            country=parsed_args.country,
-            fasin=parsed_args.fasin,
-            start_date=start_date,
-            end_date=end_date,
-        )
-        output_path = client.write_json("problem_asin_reasons", problem_reasons)
         LOGGER.info("problem_asin_reasons written to %s", output_path)
+        if parsed_args.two_phase_facts:
+            fact_rows = client.fetch_view_return_fact_texts(
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_str,
+                end_date=end_str,
+                reason_pairs=core_reason_pairs(problem_reasons),
+            )
+        elif parsed_args.stream:
+            # The first stream was consumed by the reason stage; re-stream without re-dumping.
+            fact_rows = client.stream_view_return_fact_details(
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_str,
+                end_date=end_str,
+                dump=False,
+            )
         reason_explanations = build_reason_explanations(
             problem_reasons=problem_reasons,
             fact_rows=fact_rows,
+            max_evidence_per_reason=config.max_evidence_per_reason,
         )
-        reason_path = client.write_json("reason_explanations", reason_explanations)
-        LOGGER.info("reason_explanations written to %s", reason_path)
+        for table_name, payload in explanation_tables(
+            reason_explanations, config.paths.explanation_layout
+        ).items():
+            reason_path = client.write_output(
+                table_name,
+                payload,
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_str,
+                end_date=end_str,
+            )
+            LOGGER.info("%s written to %s", table_name, reason_path)
+        for table_name in stale_explanation_tables(config.paths.explanation_layout):
+            client.remove_output(
+                table_name,
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_str,
+                end_date=end_str,
+            )
     return problem_reasons
 
 
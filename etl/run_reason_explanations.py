@@ -1,34 +1,81 @@
 from __future__ import annotations
 
 import argparse
-import json
 import logging
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from .config import build_config
-from .reason_explanations import build_reason_explanations
+from .dataset_io import DATASET_FORMATS, find_dataset, iter_dataset_rows, remove_dataset, write_dataset_file
+from .metrics import measure, run_metrics
+from .output_store import MANIFEST_NAME, OutputStore, find_artifact
+from .profiling import run_profile
+from .reason_explanations import (
+    EXPLANATION_LAYOUTS,
+    build_reason_explanations,
+    explanation_tables,
+    stale_explanation_tables,
+)
 
 LOGGER = logging.getLogger("etl.run_reason_explanations")
 
 
-def _load_json(path: Path) -> Dict[str, Any]:
-    with path.open("r", encoding="utf-8-sig") as handle:
-        return json.load(handle)
-
-
 def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser("Build reason_explanations from cached JSON files")
     parser.add_argument(
         "--problem-file",
-        help="Path to problem_asin_reasons.json (defaults to <output_dir>/problem_asin_reasons.json)",
+        help=(
+            "Path to problem_asin_reasons (defaults to the newest one in <output_dir>, any format, "
+            "or in the manifest with --partitioned-output)"
+        ),
     )
     parser.add_argument(
         "--fact-file",
-        help="Path to view_return_fact_details.json (defaults to <data_dir>/view_return_fact_details.json)",
+        help="Path to view_return_fact_details (defaults to the newest one in <data_dir>, any format)",
     )
     parser.add_argument("--data-dir", help="Directory containing input JSON files (defaults to template/input)")
     parser.add_argument("--output-dir", help="Directory to write outputs (defaults to template/output)")
+    parser.add_argument(
+        "--output-format",
+        choices=DATASET_FORMATS,
+        default="json",
+        help="Layout of reason_explanations: pretty json (default), compact json or ndjson",
+    )
+    parser.add_argument("--gzip", action="store_true", help="Gzip reason_explanations")
+    parser.add_argument(
+        "--partitioned-output",
+        action="store_true",
+        help=(
+            "Read problem_asin_reasons from and write under <output_dir>/country=/fasin=/window=, "
+            "recording the files in <output_dir>/manifest.ndjson"
+        ),
+    )
+    parser.add_argument("--country", help="Partition country (with --partitioned-output)")
+    parser.add_argument("--fasin", help="Partition parent ASIN (with --partitioned-output)")
+    parser.add_argument("--start-date", help="Partition window start, YYYY-MM-DD (with --partitioned-output)")
+    parser.add_argument("--end-date", help="Partition window end, YYYY-MM-DD (with --partitioned-output)")
+    parser.add_argument(
+        "--explanation-layout",
+        choices=EXPLANATION_LAYOUTS,
+        default="rows",
+        help="Fetched rows (default) or normalized reason_explanation_reviews + reason_explanation_edges",
+    )
+    parser.add_argument(
+        "--max-evidence",
+        type=int,
+        default=0,
+        help="Keep at most this many fact rows per core reason (default 0 keeps all)",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Record stage timings into <output_dir>/run_metrics.json and run_metrics.prom",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the stage with cProfile and tracemalloc into <output_dir>/profile",
+    )
     parser.add_argument("--log-level", default="INFO", help="Logging level")
     return parser.parse_args(argv)
 
@@ -45,35 +92,83 @@ def run(args: List[str] | None = None) -> List[Dict[str, Any]]:
         output_dir=Path(parsed_args.output_dir).resolve() if parsed_args.output_dir else None,
     )
 
-    problem_path = (
-        Path(parsed_args.problem_file)
-        if parsed_args.problem_file
-        else config.paths.output_dir / "problem_asin_reasons.json"
-    )
+    partition: Dict[str, Any] = {
+        "country": parsed_args.country,
+        "fasin": parsed_args.fasin,
+        "start_date": parsed_args.start_date,
+        "end_date": parsed_args.end_date,
+    }
+    if parsed_args.problem_file:
+        problem_path: Optional[Path] = Path(parsed_args.problem_file)
+    elif parsed_args.partitioned_output:
+        entry = find_artifact(config.paths.output_dir, "problem_asin_reasons", **partition)
+        if entry is None:
+            raise FileNotFoundError(
+                f"No problem_asin_reasons matching {partition} in {config.paths.output_dir / MANIFEST_NAME}"
+            )
+        problem_path = config.paths.output_dir / entry["path"]
+        partition = {key: entry[key] for key in partition}
+    else:
+        problem_path = find_dataset(config.paths.output_dir, "problem_asin_reasons")
     fact_path = (
         Path(parsed_args.fact_file)
         if parsed_args.fact_file
-        else config.paths.data_dir / "view_return_fact_details.json"
+        else find_dataset(config.paths.data_dir, "view_return_fact_details")
     )
 
-    if not problem_path.exists():
-        raise FileNotFoundError(f"problem_asin_reasons file not found: {problem_path}")
-    if not fact_path.exists():
-        raise FileNotFoundError(f"view_return_fact_details file not found: {fact_path}")
-
-    problem_data = _load_json(problem_path)
-    fact_data = _load_json(fact_path)
-
-    reason_explanations = build_reason_explanations(
-        problem_reasons=problem_data,
-        fact_rows=fact_data,
-    )
-    output_path = config.paths.output_dir / "reason_explanations.json"
-    output_path.write_text(
-        json.dumps({"reason_explanations": reason_explanations}, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
-    LOGGER.info("Wrote %d reason explanations to %s", len(reason_explanations), output_path)
+    if problem_path is None or not problem_path.exists():
+        raise FileNotFoundError(f"problem_asin_reasons file not found: {problem_path or config.paths.output_dir}")
+    if fact_path is None or not fact_path.exists():
+        raise FileNotFoundError(f"view_return_fact_details file not found: {fact_path or config.paths.data_dir}")
+
+    problem_rows = list(iter_dataset_rows(problem_path, "problem_asin_reasons"))
+    if parsed_args.partitioned_output:
+        # An explicit --problem-file names its partition through the flags or its own rows.
+        for key, value in partition.items():
+            if value is None and problem_rows:
+                partition[key] = problem_rows[0].get(key)
+        missing = [key for key, value in partition.items() if not value]
+        if missing:
+            raise ValueError(
+                "Cannot name the output partition: pass "
+                + ", ".join(f"--{key.replace('_', '-')}" for key in missing)
+            )
+    # Facts are decoded one row at a time, so memory follows the output rather than the dump.
+    fact_rows = iter_dataset_rows(fact_path, "view_return_fact_details")
+
+    with run_metrics(
+        parsed_args.metrics, config.paths.output_dir, entry_point="run_reason_explanations"
+    ), run_profile(parsed_args.profile, config.paths.output_dir, "run_reason_explanations"):
+        reason_explanations = build_reason_explanations(
+            problem_reasons=problem_rows,
+            fact_rows=fact_rows,
+            max_evidence_per_reason=parsed_args.max_evidence,
+        )
+        store = (
+            OutputStore(config.paths.output_dir, fmt=parsed_args.output_format, compress=parsed_args.gzip)
+            if parsed_args.partitioned_output
+            else None
+        )
+        for table_name, payload in explanation_tables(reason_explanations, parsed_args.explanation_layout).items():
+            if store is None:
+                with measure("write", table_name, rows_in=len(payload)):
+                    output_path = write_dataset_file(
+                        config.paths.output_dir,
+                        table_name,
+                        payload,
+                        fmt=parsed_args.output_format,
+                        compress=parsed_args.gzip,
+                    )
+            else:
+                # Same partition as the problem reasons; a parent without problem ASINs gets empty tables.
+                output_path = store.write(table_name, payload, **partition)
+            LOGGER.info("Wrote %d %s rows to %s", len(payload), table_name, output_path)
+        for table_name in stale_explanation_tables(parsed_args.explanation_layout):
+            if store is None:
+                for path in remove_dataset(config.paths.output_dir, table_name):
+                    LOGGER.info("Removed %s", path)
+            else:
+                store.remove(table_name, **partition)
     return reason_explanations
 
 
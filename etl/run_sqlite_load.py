@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, List
+
+from .config import build_config
+from .sqlite_client import SQLITE_TABLES, load_sqlite_database
+
+LOGGER = logging.getLogger("etl.run_sqlite_load")
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser("Load dumped Doris datasets into an indexed SQLite source")
+    parser.add_argument("--db", required=True, help="SQLite file to create or update (use with --source sqlite:<db>)")
+    parser.add_argument("--data-dir", help="Directory containing the dumps (defaults to template/input)")
+    parser.add_argument(
+        "--tables",
+        help=f"Comma separated tables to load (defaults to {','.join(SQLITE_TABLES)})",
+    )
+    parser.add_argument("--append", action="store_true", help="Append rows instead of replacing each table")
+    parser.add_argument("--log-level", default="INFO", help="Logging level")
+    return parser.parse_args(argv)
+
+
+def run(args: List[str] | None = None) -> Dict[str, int]:
+    parsed_args = parse_args(args)
+    logging.basicConfig(
+        level=getattr(logging, (parsed_args.log_level or "INFO").upper(), logging.INFO),
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    config = build_config(data_dir=Path(parsed_args.data_dir).resolve() if parsed_args.data_dir else None)
+    tables = [item.strip() for item in parsed_args.tables.split(",") if item.strip()] if parsed_args.tables else None
+    unknown = set(tables or ()) - set(SQLITE_TABLES)
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+    counts = load_sqlite_database(
+        Path(parsed_args.db).resolve(),
+        config.paths.data_dir,
+        tables=tables,
+        append=parsed_args.append,
+    )
+    LOGGER.info("SQLite source %s ready: %s", parsed_args.db, counts)
+    return counts
+
+
+def main() -> None:
+    run()
+
+
+if __name__ == "__main__":
+    main()
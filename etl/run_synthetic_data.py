@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, List
+
+from .cli_utils import add_synthetic_arguments, resolve_synthetic_spec
+from .config import BASE_DIR
+from .dataset_io import DATASET_FORMATS
+from .synthetic_data import write_synthetic_datasets
+
+LOGGER = logging.getLogger("etl.run_synthetic_data")
+
+DEFAULT_SYNTHETIC_DIR = BASE_DIR / "template" / "synthetic"
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser("Generate seeded synthetic snapshot, fact and tag dumps in the Doris schema")
+    add_synthetic_arguments(parser)
+    parser.add_argument(
+        "--data-dir",
+        default=str(DEFAULT_SYNTHETIC_DIR),
+        help=f"Directory for the generated dumps (defaults to {DEFAULT_SYNTHETIC_DIR})",
+    )
+    parser.add_argument("--output-format", choices=DATASET_FORMATS, default="json", help="Dump layout")
+    parser.add_argument("--gzip", action="store_true", help="Gzip the dumps")
+    parser.add_argument("--log-level", default="INFO", help="Logging level")
+    return parser.parse_args(argv)
+
+
+def run(args: List[str] | None = None) -> Dict[str, int]:
+    parsed_args = parse_args(args)
+    logging.basicConfig(
+        level=getattr(logging, (parsed_args.log_level or "INFO").upper(), logging.INFO),
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    spec = resolve_synthetic_spec(parsed_args)
+    LOGGER.info(
+        "Generating %s/%s: %d ASINs x %d days (%s ~ %s), %d reviews, seed %d",
+        spec.country,
+        spec.fasin,
+        spec.asins,
+        spec.days,
+        spec.start_date,
+        spec.end_date,
+        spec.reviews,
+        spec.seed,
+    )
+    return write_synthetic_datasets(
+        Path(parsed_args.data_dir).resolve(),
+        spec,
+        fmt=parsed_args.output_format,
+        compress=parsed_args.gzip,
+    )
+
+
+def main() -> None:
+    run()
+
+
+if __name__ == "__main__":
+    main()
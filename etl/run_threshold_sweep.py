@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .cli_utils import build_stage_parser, format_window, resolve_runtime, stage_instrumentation
+from .data_source import create_client
+from .dataset_io import load_dataset
+from .doris_client import DorisClient
+from .parent_summary import aggregate_snapshot, calculate_parent_summary
+from .threshold_sweep import expand_threshold_grid, sweep_thresholds
+
+LOGGER = logging.getLogger("etl.run_threshold_sweep")
+
+
+def _load_json(path: Path) -> Any:
+    with path.open("r", encoding="utf-8-sig") as handle:
+        return json.load(handle)
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = build_stage_parser("Classify ASINs under a grid of threshold sets and report class flips")
+    parser.add_argument(
+        "--grid",
+        required=True,
+        help=(
+            "JSON file with either a list of ThresholdConfig overrides or a dict of "
+            "threshold name -> list of values (expanded to their cartesian product)"
+        ),
+    )
+    parser.add_argument(
+        "--snapshot-file",
+        help=(
+            "Previously dumped view_return_snapshot(_agg) file, in any --output-format, to sweep "
+            "without querying Doris; daily dumps are filtered to the window"
+        ),
+    )
+    return parser.parse_args(argv)
+
+
+def run(args: List[str] | None = None) -> Dict[str, Any]:
+    parsed_args = parse_args(args)
+    logging.basicConfig(
+        level=getattr(logging, (parsed_args.log_level or "INFO").upper(), logging.INFO),
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    config, start_date, end_date = resolve_runtime(parsed_args)
+    start_str, end_str = format_window(start_date, end_date)
+    scenarios = expand_threshold_grid(_load_json(Path(parsed_args.grid)))
+    LOGGER.info("Threshold sweep window %s ~ %s with %d scenarios", start_str, end_str, len(scenarios))
+
+    with stage_instrumentation(parsed_args, config, "run_threshold_sweep"), create_client(config) as client:
+        if parsed_args.snapshot_file:
+            payload = load_dataset(Path(parsed_args.snapshot_file))
+            table_name = next(iter(payload)) if isinstance(payload, dict) else ""
+            snapshot_rows = payload[table_name] if table_name else payload
+            aggregated = table_name == DorisClient.SNAPSHOT_TABLES["aggregated"]
+        else:
+            snapshot_rows = client.fetch_snapshot(
+                mode=parsed_args.snapshot_mode,
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_str,
+                end_date=end_str,
+                lookback_days=parsed_args.lookback_days,
+            )
+            aggregated = parsed_args.snapshot_mode == "aggregated"
+        snapshot = aggregate_snapshot(
+            snapshot_rows,
+            country=parsed_args.country,
+            fasin=parsed_args.fasin,
+            start_date=start_date,
+            end_date=end_date,
+            aggregated=aggregated,
+        )
+        parent_summary = calculate_parent_summary(
+            snapshot,
+            country=parsed_args.country,
+            fasin=parsed_args.fasin,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        started = time.perf_counter()
+        report = sweep_thresholds(
+            snapshot,
+            parent_summary=parent_summary,
+            baseline=config.thresholds,
+            scenarios=scenarios,
+        )
+        LOGGER.info(
+            "Classified %d ASINs under %d scenarios in %.1f ms",
+            report["asin_count"],
+            len(scenarios) + 1,
+            (time.perf_counter() - started) * 1000,
+        )
+        output_path = client.write_output(
+            "threshold_sweep",
+            report,
+            country=parsed_args.country,
+            fasin=parsed_args.fasin,
+            start_date=start_str,
+            end_date=end_str,
+        )
+        LOGGER.info("threshold_sweep written to %s", output_path)
+    return report
+
+
+def main() -> None:
+    run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import argparse
+import logging
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from .asin_structure import build_asin_structure
+from .calculator import format_date
+from .cli_utils import build_stage_parser, resolve_runtime, stage_instrumentation
+from .data_source import create_client
+from .parent_summary import aggregate_snapshot, calculate_parent_summary
+from .snapshot_cube import SnapshotCube
+
+LOGGER = logging.getLogger("etl.run_windows")
+
+DEFAULT_WINDOWS = "7,30,90,365"
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = build_stage_parser("Run parent summary and ASIN structure for several windows ending on the same day")
+    parser.add_argument(
+        "--windows",
+        default=DEFAULT_WINDOWS,
+        help=f"Comma separated window lengths in days (defaults to {DEFAULT_WINDOWS})",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_windows(value: str) -> List[int]:
+    windows: List[int] = []
+    for item in value.split(","):
+        item = item.strip().lower().rstrip("d")
+        if not item:
+            continue
+        days = int(item)
+        if days <= 0:
+            raise ValueError(f"Window length must be positive: {days}")
+        if days not in windows:
+            windows.append(days)
+    if not windows:
+        raise ValueError("--windows needs at least one window length")
+    return sorted(windows)
+
+
+def run(args: List[str] | None = None) -> Dict[str, Dict[str, object]]:
+    parsed_args = parse_args(args)
+    logging.basicConfig(
+        level=getattr(logging, (parsed_args.log_level or "INFO").upper(), logging.INFO),
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    config, _, end_date = resolve_runtime(parsed_args)
+    windows = parse_windows(parsed_args.windows)
+    fetch_start = end_date - timedelta(days=windows[-1] - 1)
+    # The cube is built from daily rows; Doris-side aggregation would collapse the days.
+    snapshot_mode = "incremental" if parsed_args.snapshot_mode == "incremental" else "daily"
+    LOGGER.info(
+        "Windows %s ending %s; fetching %s ~ %s once",
+        ",".join(f"{days}d" for days in windows),
+        format_date(end_date),
+        format_date(fetch_start),
+        format_date(end_date),
+    )
+
+    results: Dict[str, Dict[str, object]] = {}
+    with stage_instrumentation(parsed_args, config, "run_windows"), create_client(config) as client:
+        snapshot_rows = client.fetch_snapshot(
+            mode=snapshot_mode,
+            country=parsed_args.country,
+            fasin=parsed_args.fasin,
+            start_date=format_date(fetch_start),
+            end_date=format_date(end_date),
+            lookback_days=parsed_args.lookback_days,
+        )
+        cube = SnapshotCube.from_rows(snapshot_rows, country=parsed_args.country, fasin=parsed_args.fasin)
+        for days in windows:
+            start_date = end_date - timedelta(days=days - 1)
+            snapshot = aggregate_snapshot(
+                cube,
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_date,
+                end_date=end_date,
+            )
+            parent_summary = calculate_parent_summary(
+                snapshot,
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_date,
+                end_date=end_date,
+            )
+            asin_structure = build_asin_structure(
+                snapshot,
+                country=parsed_args.country,
+                fasin=parsed_args.fasin,
+                start_date=start_date,
+                end_date=end_date,
+                parent_summary=parent_summary,
+                thresholds=config.thresholds,
+            )
+            label = f"{days}d"
+            subdir = Path("windows") / label
+            for table_name, payload in (("parent_summary", parent_summary), ("asin_structure", asin_structure)):
+                client.write_output(
+                    table_name,
+                    payload,
+                    country=parsed_args.country,
+                    fasin=parsed_args.fasin,
+                    start_date=format_date(start_date),
+                    end_date=format_date(end_date),
+                    subdir=subdir,
+                )
+            LOGGER.info(
+                "%s: units_sold=%s units_returned=%s return_rate=%.4f, %d ASIN rows",
+                label,
+                parent_summary.get("units_sold"),
+                parent_summary.get("units_returned"),
+                parent_summary.get("return_rate"),
+                len(asin_structure),
+            )
+            results[label] = {"parent_summary": parent_summary, "asin_structure": asin_structure}
+    return results
+
+
+def main() -> None:
+    run()
+
+
+if __name__ == "__main__":
+    main()
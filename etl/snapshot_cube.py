@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from array import array
+from typing import Dict, Iterable, Tuple
+
+from .calculator import DateInput, parse_date
+from .snapshot_frame import SnapshotFrame, np
+
+
+class SnapshotCube:
+    """
+    Cumulative daily units per ASIN for one parent.
+
+    Built once from daily snapshot rows, the cube holds for every ASIN the running totals
+    of ``units_sold``, ``units_returned`` and row counts over the covered day range. The
+    totals of any ``[start_date, end_date]`` are then two lookups per ASIN, so 7/30/90/365
+    day windows share one fetch and one pass over the rows. Days outside the covered range
+    contribute nothing, the same as filtering rows that were never fetched.
+    """
+
+    __slots__ = (
+        "country",
+        "fasin",
+        "asins",
+        "first_ordinal",
+        "days",
+        "_sold",
+        "_returned",
+        "_rows",
+    )
+
+    def __init__(self, *, country: str, fasin: str) -> None:
+        self.country = country
+        self.fasin = fasin
+        self.asins: list = []
+        self.first_ordinal = 0
+        self.days = 0
+        # Row-major (asin, day) prefix sums with a leading zero column: width is days + 1.
+        self._sold = array("q")
+        self._returned = array("q")
+        self._rows = array("q")
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict], *, country: str, fasin: str) -> "SnapshotCube":
+        return cls.from_frame(SnapshotFrame.from_rows(rows, country=country, fasin=fasin))
+
+    @classmethod
+    def from_frame(cls, frame: SnapshotFrame) -> "SnapshotCube":
+        if frame.aggregated:
+            raise ValueError("A snapshot cube needs daily rows; aggregated frames carry no dates")
+        cube = cls(country=frame.country, fasin=frame.fasin)
+        cube.asins = list(frame.asins)
+        if not len(frame):
+            return cube
+        cube.first_ordinal = min(frame.date_ordinals)
+        cube.days = max(frame.date_ordinals) - cube.first_ordinal + 1
+        if np is not None:
+            cube._fill_numpy(frame)
+        else:
+            cube._fill(frame)
+        return cube
+
+    def _fill(self, frame: SnapshotFrame) -> None:
+        width = self.days + 1
+        size = len(self.asins) * width
+        sold = array("q", bytes(8 * size))
+        returned = array("q", bytes(8 * size))
+        rows = array("q", bytes(8 * size))
+        first = self.first_ordinal
+        for idx, code in enumerate(frame.asin_codes):
+            cell = code * width + frame.date_ordinals[idx] - first + 1
+            sold[cell] += frame.units_sold[idx]
+            returned[cell] += frame.units_returned[idx]
+            rows[cell] += 1
+        for base in range(0, size, width):
+            for cell in range(base + 1, base + width):
+                sold[cell] += sold[cell - 1]
+                returned[cell] += returned[cell - 1]
+                rows[cell] += rows[cell - 1]
+        self._sold, self._returned, self._rows = sold, returned, rows
+
+    def _fill_numpy(self, frame: SnapshotFrame) -> None:
+        shape = (len(self.asins), self.days + 1)
+        codes = np.frombuffer(frame.asin_codes, dtype=np.int32)
+        days = np.frombuffer(frame.date_ordinals, dtype=np.int32) - self.first_ordinal + 1
+        cells = np.ravel_multi_index((codes, days), shape)
+        size = shape[0] * shape[1]
+
+        def prefix(weights) -> array:
+            grid = np.bincount(cells, weights=weights, minlength=size).astype(np.int64).reshape(shape)
+            return array("q", np.cumsum(grid, axis=1).tobytes())
+
+        self._sold = prefix(np.frombuffer(frame.units_sold, dtype=np.int64))
+        self._returned = prefix(np.frombuffer(frame.units_returned, dtype=np.int64))
+        self._rows = prefix(None)
+
+    def matches(self, country: str, fasin: str) -> bool:
+        return self.country == country and self.fasin == fasin
+
+    def group_sums(self, start_date: DateInput, end_date: DateInput) -> Dict[str, Tuple[int, int]]:
+        """Per-ASIN ``(units_sold, units_returned)`` for ASINs with rows inside the window."""
+        if not self.days:
+            return {}
+        start = max(parse_date(start_date).toordinal() - self.first_ordinal, 0)
+        end = min(parse_date(end_date).toordinal() - self.first_ordinal, self.days - 1)
+        if start > end:
+            return {}
+        width = self.days + 1
+        sums: Dict[str, Tuple[int, int]] = {}
+        for code, asin in enumerate(self.asins):
+            lo = code * width + start
+            hi = code * width + end + 1
+            if self._rows[hi] == self._rows[lo]:
+                continue
+            sums[asin] = (self._sold[hi] - self._sold[lo], self._returned[hi] - self._returned[lo])
+        return sums
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from array import array
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .calculator import DateInput, parse_date
+
+try:  # NumPy is optional; the frame falls back to plain loops over the arrays.
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+
+def _to_ordinal(value: Any) -> int:
+    if isinstance(value, str) and len(value) >= 10:
+        try:
+            return date.fromisoformat(value[:10]).toordinal()
+        except ValueError:
+            pass
+    return parse_date(value).toordinal()
+
+
+def _to_units(value: Any) -> int:
+    if value is None:
+        return 0
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+class SnapshotFrame:
+    """
+    Columnar view of one parent's view_return_snapshot rows.
+
+    ASINs are dictionary-encoded into ``asin_codes``, dates are stored as ordinals and
+    units as int64 arrays, so every window query is a mask plus group-sum instead of
+    a re-parse of the row dicts. Frames built from pre-aggregated rows carry no dates
+    and ignore the window. Rows without an ASIN are kept under the empty ASIN ``""``:
+    they count towards the parent totals but belong to no child.
+    """
+
+    __slots__ = (
+        "country",
+        "fasin",
+        "asins",
+        "asin_codes",
+        "date_ordinals",
+        "units_sold",
+        "units_returned",
+        "_code_index",
+    )
+
+    def __init__(self, *, country: str, fasin: str, aggregated: bool = False) -> None:
+        self.country = country
+        self.fasin = fasin
+        self.asins: List[str] = []
+        self.asin_codes = array("i")
+        self.date_ordinals: Optional[array] = None if aggregated else array("i")
+        self.units_sold = array("q")
+        self.units_returned = array("q")
+        self._code_index: Dict[str, int] = {}
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Iterable[Dict],
+        *,
+        country: str,
+        fasin: str,
+        aggregated: bool = False,
+    ) -> "SnapshotFrame":
+        frame = cls(country=country, fasin=fasin, aggregated=aggregated)
+        for row in rows:
+            if row.get("country") != country or row.get("fasin") != fasin:
+                continue
+            frame.append(
+                row.get("asin") or "",
+                None if aggregated else row.get("snapshot_date"),
+                row.get("units_sold"),
+                row.get("units_returned"),
+            )
+        return frame
+
+    def append(self, asin: str, snapshot_date: Any, units_sold: Any, units_returned: Any) -> None:
+        code = self._code_index.get(asin)
+        if code is None:
+            code = self._code_index[asin] = len(self.asins)
+            self.asins.append(asin)
+        self.asin_codes.append(code)
+        if self.date_ordinals is not None:
+            self.date_ordinals.append(_to_ordinal(snapshot_date))
+        self.units_sold.append(_to_units(units_sold))
+        self.units_returned.append(_to_units(units_returned))
+
+    def __len__(self) -> int:
+        return len(self.asin_codes)
+
+    @property
+    def aggregated(self) -> bool:
+        return self.date_ordinals is None
+
+    def matches(self, country: str, fasin: str) -> bool:
+        return self.country == country and self.fasin == fasin
+
+    def group_sums(self, start_date: DateInput, end_date: DateInput) -> Dict[str, Tuple[int, int]]:
+        """
+        Per-ASIN ``(units_sold, units_returned)`` for ASINs with rows inside the window; the
+        ``""`` key holds rows without an ASIN.
+        """
+        if not len(self):
+            return {}
+        start = parse_date(start_date).toordinal()
+        end = parse_date(end_date).toordinal()
+        if np is not None:
+            return self._group_sums_numpy(start, end)
+        sold = [0] * len(self.asins)
+        returned = [0] * len(self.asins)
+        present = [False] * len(self.asins)
+        dates = self.date_ordinals
+        for idx, code in enumerate(self.asin_codes):
+            if dates is not None and not start <= dates[idx] <= end:
+                continue
+            present[code] = True
+            sold[code] += self.units_sold[idx]
+            returned[code] += self.units_returned[idx]
+        return {asin: (sold[code], returned[code]) for code, asin in enumerate(self.asins) if present[code]}
+
+    def _group_sums_numpy(self, start: int, end: int) -> Dict[str, Tuple[int, int]]:
+        codes = np.frombuffer(self.asin_codes, dtype=np.int32)
+        sold = np.frombuffer(self.units_sold, dtype=np.int64)
+        returned = np.frombuffer(self.units_returned, dtype=np.int64)
+        if self.date_ordinals is not None:
+            dates = np.frombuffer(self.date_ordinals, dtype=np.int32)
+            mask = (dates >= start) & (dates <= end)
+            codes, sold, returned = codes[mask], sold[mask], returned[mask]
+        size = len(self.asins)
+        counts = np.bincount(codes, minlength=size)
+        sold_sums = np.bincount(codes, weights=sold, minlength=size)
+        returned_sums = np.bincount(codes, weights=returned, minlength=size)
+        return {
+            self.asins[code]: (int(sold_sums[code]), int(returned_sums[code]))
+            for code in np.flatnonzero(counts)
+        }
+
+    def totals(self, start_date: DateInput, end_date: DateInput) -> Tuple[int, int]:
+        sums = self.group_sums(start_date, end_date)
+        return sum(item[0] for item in sums.values()), sum(item[1] for item in sums.values())
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .config import CacheConfig, DatabaseConfig, PathConfig
+from .dataset_io import find_dataset, iter_dataset_rows
+from .doris_client import DorisClient
+
+LOGGER = logging.getLogger("etl.sqlite_client")
+
+SQLITE_TABLES: Dict[str, List[str]] = {
+    "view_return_snapshot": [
+        "country TEXT",
+        "fasin TEXT",
+        "asin TEXT",
+        "snapshot_date TEXT",
+        "units_sold INTEGER",
+        "units_returned INTEGER",
+    ],
+    "view_return_fact_details": [
+        "country TEXT",
+        "fasin TEXT",
+        "asin TEXT",
+        "review_id TEXT",
+        "review_source INTEGER",
+        "review_date TEXT",
+        "tag_code TEXT",
+        "review_en TEXT",
+        "review_cn TEXT",
+        "sentiment INTEGER",
+        "tag_name_cn TEXT",
+        "evidence TEXT",
+        "created_at TEXT",
+        "updated_at TEXT",
+    ],
+    "return_dim_tag": [
+        "tag_code TEXT",
+        "tag_name_cn TEXT",
+        "category_code TEXT",
+        "category_name_cn TEXT",
+        "level INTEGER",
+        "definition TEXT",
+        "boundary_note TEXT",
+        "is_active INTEGER",
+        "version INTEGER",
+        "effective_from TEXT",
+        "effective_to TEXT",
+        "created_at TEXT",
+        "updated_at TEXT",
+    ],
+}
+SQLITE_INDEXES = {
+    "idx_snapshot_parent_date": "view_return_snapshot (country, fasin, snapshot_date)",
+    "idx_fact_parent_asin_date": "view_return_fact_details (country, fasin, asin, review_date)",
+}
+INSERT_BATCH_ROWS = 5000
+
+
+def _columns(table_name: str) -> List[str]:
+    return [column.split()[0] for column in SQLITE_TABLES[table_name]]
+
+
+def load_sqlite_database(
+    db_path: Path,
+    data_dir: Path,
+    *,
+    tables: Optional[Iterable[str]] = None,
+    append: bool = False,
+) -> Dict[str, int]:
+    """
+    Load dumped datasets from ``data_dir`` (any format) into an indexed SQLite file.
+
+    Each table is replaced unless ``append`` is set. Rows are streamed in batches, so the
+    dump never has to fit in memory.
+    """
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    counts: Dict[str, int] = {}
+    connection = sqlite3.connect(str(db_path))
+    try:
+        for table_name in tables or SQLITE_TABLES:
+            source = find_dataset(Path(data_dir), table_name)
+            if source is None:
+                LOGGER.warning("No %s dump in %s; table left unchanged", table_name, data_dir)
+                continue
+            columns = _columns(table_name)
+            if not append:
+                connection.execute(f"DROP TABLE IF EXISTS {table_name}")
+            connection.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(SQLITE_TABLES[table_name])})")
+            insert_sql = (
+                f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+            )
+            batch: List[Sequence[Any]] = []
+            count = 0
+            for row in iter_dataset_rows(source, table_name):
+                batch.append([row.get(column) for column in columns])
+                if len(batch) >= INSERT_BATCH_ROWS:
+                    connection.executemany(insert_sql, batch)
+                    count += len(batch)
+                    batch.clear()
+            if batch:
+                connection.executemany(insert_sql, batch)
+                count += len(batch)
+            counts[table_name] = count
+            LOGGER.info("Loaded %d %s rows from %s", count, table_name, source)
+        for index_name, target in SQLITE_INDEXES.items():
+            table_name = target.split()[0]
+            if connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+            ).fetchone():
+                connection.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}")
+        connection.execute("ANALYZE")
+        connection.commit()
+    finally:
+        connection.close()
+    return counts
+
+
+class SqliteClient(DorisClient):
+    """
+    DorisClient that answers the same ``fetch_*`` queries from a local SQLite file.
+
+    Only the connection and cursor handling differ: the Doris SQL is run as-is with
+    ``?`` placeholders, so dumps, caches and digests behave exactly like a Doris run.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        paths: PathConfig,
+        cache: Optional[CacheConfig] = None,
+        database: Optional[DatabaseConfig] = None,
+    ) -> None:
+        self.db_path = Path(db_path)
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"SQLite source not found: {self.db_path} (build it with etl.run_sqlite_load)")
+        super().__init__(database or DatabaseConfig(), paths, cache)
+
+    def source_identity(self) -> str:
+        return f"sqlite:{self.db_path.resolve()}"
+
+    def _open_connection(self) -> sqlite3.Connection:
+        # Pooled connections move between fetch threads, one checkout at a time.
+        return sqlite3.connect(str(self.db_path), check_same_thread=False)
+
+    @staticmethod
+    def _sqlite_sql(sql: str) -> str:
+        return sql.replace("%s", "?")
+
+    def _query_rows(
+        self,
+        connection: sqlite3.Connection,
+        sql: str,
+        params: Sequence[Any],
+    ) -> List[Dict[str, Any]]:
+        cursor = connection.execute(self._sqlite_sql(sql), tuple(params))
+        try:
+            columns = [item[0] for item in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def _iter_query(self, sql: str, params: Sequence[Any]) -> Iterator[Dict[str, Any]]:
+        with self._pooled_connection() as connection:
+            cursor = connection.execute(self._sqlite_sql(sql), tuple(params))
+            try:
+                columns = [item[0] for item in cursor.description]
+                for row in cursor:
+                    yield dict(zip(columns, row))
+            finally:
+                cursor.close()
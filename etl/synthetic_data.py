@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import logging
+import random
+import string
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .calculator import format_date, parse_date
+from .dataset_io import RowWriter, dataset_path, open_dataset
+
+LOGGER = logging.getLogger("etl.synthetic_data")
+
+# Preset sizes; "large" is the 5,000 ASIN x 365 day shape of the biggest parents.
+SYNTHETIC_SCALES: Dict[str, Dict[str, int]] = {
+    "small": {"asins": 200, "days": 90, "reviews": 20_000},
+    "medium": {"asins": 1_000, "days": 365, "reviews": 200_000},
+    "large": {"asins": 5_000, "days": 365, "reviews": 2_000_000},
+}
+SYNTHETIC_TABLES = ("view_return_snapshot", "view_return_fact_details", "return_dim_tag")
+
+_TAG_CATEGORIES = (
+    ("CAT_STRUCT_FIT", "结构与尺寸"),
+    ("CAT_MATERIAL_LOOK", "材质与外观"),
+    ("CAT_INSTALL_USE", "安装与使用"),
+    ("CAT_INFO_EXPECT", "信息与预期"),
+    ("CAT_FULFILL_SERVICE", "履约与服务"),
+)
+_RETURN_REASONS = ("DEFECTIVE", "NOT_AS_DESCRIBED", "UNWANTED_ITEM", "DAMAGED_BY_CARRIER", "MISSING_PARTS")
+_TEXT_VARIANTS = 6
+_AUDIT_TIMESTAMP = "2025-11-18T03:21:26"
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    """Shape of a generated parent; the same spec and seed always yield the same rows."""
+
+    country: str = "US"
+    fasin: str = "B0SYNTH000"
+    asins: int = 200
+    days: int = 90
+    reviews: int = 20_000
+    tags: int = 40
+    end_date: str = "2025-09-30"
+    seed: int = 7
+    problem_share: float = 0.1
+    max_tags_per_review: int = 3
+
+    @property
+    def start_date(self) -> str:
+        return format_date(parse_date(self.end_date) - timedelta(days=self.days - 1))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def synthetic_spec(scale: str = "small", **overrides: Any) -> SyntheticSpec:
+    if scale not in SYNTHETIC_SCALES:
+        raise ValueError(f"Unknown scale {scale!r}; expected one of {', '.join(SYNTHETIC_SCALES)}")
+    spec = replace(SyntheticSpec(), **SYNTHETIC_SCALES[scale])
+    spec = replace(spec, **{key: value for key, value in overrides.items() if value is not None})
+    if spec.asins <= 0 or spec.days <= 0 or spec.tags <= 0 or spec.reviews < 0:
+        raise ValueError(f"Synthetic sizes must be positive: {spec}")
+    return spec
+
+
+def _rng(spec: SyntheticSpec, stream: str) -> random.Random:
+    # One generator per dataset, so each table is reproducible on its own.
+    return random.Random(f"{spec.seed}:{stream}")
+
+
+def _asin_profiles(spec: SyntheticSpec) -> List[Tuple[str, float, float]]:
+    """(asin, sales weight, return rate) per child; weights follow a long tail like real parents."""
+    rng = _rng(spec, "asins")
+    alphabet = string.ascii_uppercase + string.digits
+    seen = {spec.fasin}
+    profiles: List[Tuple[str, float, float]] = []
+    for rank in range(spec.asins):
+        asin = spec.fasin
+        while asin in seen:
+            asin = "B0" + "".join(rng.choice(alphabet) for _ in range(8))
+        seen.add(asin)
+        weight = 1.0 / (rank + 1) ** 1.2
+        return_rate = 0.03 + rng.random() * 0.05
+        if rng.random() < spec.problem_share:
+            return_rate *= 4
+        profiles.append((asin, weight, return_rate))
+    return profiles
+
+
+def tag_rows(spec: SyntheticSpec) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    for index in range(spec.tags):
+        category_code, category_name = _TAG_CATEGORIES[index % len(_TAG_CATEGORIES)]
+        rows.append(
+            {
+                "tag_code": f"SYN_TAG_{index + 1:03d}",
+                "tag_name_cn": f"{category_name}问题{index + 1}",
+                "category_code": category_code,
+                "category_name_cn": category_name,
+                "level": 2,
+                "definition": f"Synthetic tag {index + 1} in {category_code}.",
+                "boundary_note": "",
+                "is_active": 1,
+                "version": 1,
+                "effective_from": "2025-01-01",
+                "effective_to": None,
+                "created_at": _AUDIT_TIMESTAMP,
+                "updated_at": _AUDIT_TIMESTAMP,
+            }
+        )
+    return rows
+
+
+def iter_snapshot_rows(spec: SyntheticSpec) -> Iterator[Dict[str, Any]]:
+    """Daily view_return_snapshot rows, one per ASIN and day, ordered by date like the Doris view."""
+    rng = _rng(spec, "snapshot")
+    profiles = _asin_profiles(spec)
+    total_weight = sum(weight for _, weight, _ in profiles)
+    # Roughly 40 units a day per child, spread over the long tail.
+    daily_units = [40.0 * spec.asins * weight / total_weight for _, weight, _ in profiles]
+    start = parse_date(spec.start_date)
+    for offset in range(spec.days):
+        snapshot_date = format_date(start + timedelta(days=offset))
+        for (asin, _, return_rate), mean_units in zip(profiles, daily_units):
+            units_sold = int(mean_units * rng.uniform(0.5, 1.5) + rng.random())
+            yield {
+                "country": spec.country,
+                "fasin": spec.fasin,
+                "asin": asin,
+                "snapshot_date": snapshot_date,
+                "units_sold": units_sold,
+                "units_returned": int(units_sold * return_rate + rng.random()),
+            }
+
+
+def iter_fact_rows(spec: SyntheticSpec) -> Iterator[Dict[str, Any]]:
+    """
+    view_return_fact_details rows: ``spec.reviews`` reviews with 1..max_tags_per_review tags each.
+
+    Reviews land on ASINs in proportion to their returns and every ASIN favours a few tags,
+    so problem ASINs get a realistic handful of core reasons. Rows of one review share
+    their text strings.
+    """
+    rng = _rng(spec, "facts")
+    profiles = _asin_profiles(spec)
+    tags = tag_rows(spec)
+    asins = [asin for asin, _, _ in profiles]
+    cum_weights = list(accumulate(weight * return_rate for _, weight, return_rate in profiles))
+    texts = [
+        [
+            (
+                f"{_RETURN_REASONS[variant % len(_RETURN_REASONS)]}: synthetic complaint {variant} about {tag['tag_code']}.",
+                f"合成评论{variant}：{tag['tag_name_cn']}",
+                f"complaint {variant} about {tag['tag_code']}",
+            )
+            for variant in range(_TEXT_VARIANTS)
+        ]
+        for tag in tags
+    ]
+    window_start = datetime.combine(parse_date(spec.start_date), datetime.min.time())
+    window_seconds = spec.days * 86400
+    for review_index, asin_index in enumerate(
+        rng.choices(range(len(asins)), cum_weights=cum_weights, k=spec.reviews)
+    ):
+        review_id = f"{rng.randrange(100, 1000)}-{rng.randrange(10**7):07d}-{review_index % 10**7:07d}"
+        review_date = (window_start + timedelta(seconds=rng.randrange(window_seconds))).isoformat()
+        # Mostly source 1 like production; a few source 2 rows exercise the source filter.
+        source_roll = rng.random()
+        review_source = 1 if source_roll < 0.85 else 0 if source_roll < 0.97 else 2
+        tag_indexes = {
+            (asin_index * 7 + min(int(rng.expovariate(0.5)), spec.tags - 1)) % spec.tags
+            for _ in range(rng.randint(1, spec.max_tags_per_review))
+        }
+        variant = rng.randrange(_TEXT_VARIANTS)
+        for tag_index in sorted(tag_indexes):
+            review_en, review_cn, evidence = texts[tag_index][variant]
+            yield {
+                "country": spec.country,
+                "fasin": spec.fasin,
+                "asin": asins[asin_index],
+                "review_id": review_id,
+                "review_source": review_source,
+                "review_date": review_date,
+                "tag_code": tags[tag_index]["tag_code"],
+                "review_en": review_en,
+                "review_cn": review_cn,
+                "sentiment": -1,
+                "tag_name_cn": tags[tag_index]["tag_name_cn"],
+                "evidence": evidence,
+                "created_at": _AUDIT_TIMESTAMP,
+                "updated_at": _AUDIT_TIMESTAMP,
+            }
+
+
+def generate_datasets(spec: SyntheticSpec) -> Dict[str, List[Dict[str, Any]]]:
+    """All three input tables in memory, keyed like the Doris dumps."""
+    return {
+        "view_return_snapshot": list(iter_snapshot_rows(spec)),
+        "view_return_fact_details": list(iter_fact_rows(spec)),
+        "return_dim_tag": tag_rows(spec),
+    }
+
+
+def write_synthetic_datasets(
+    directory: Path,
+    spec: SyntheticSpec,
+    *,
+    fmt: str = "json",
+    compress: bool = False,
+) -> Dict[str, int]:
+    """Stream the generated tables into ``directory`` as regular dumps; returns row counts."""
+    producers = {
+        "view_return_snapshot": iter_snapshot_rows,
+        "view_return_fact_details": iter_fact_rows,
+        "return_dim_tag": tag_rows,
+    }
+    counts: Dict[str, int] = {}
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    for table_name in SYNTHETIC_TABLES:
+        path = dataset_path(Path(directory), table_name, fmt=fmt, compress=compress)
+        with open_dataset(path, "w") as handle:
+            writer = RowWriter(handle, table_name, fmt)
+            for row in producers[table_name](spec):
+                writer.write(row)
+            writer.close()
+        counts[table_name] = writer.count
+        LOGGER.info("Wrote %d synthetic %s rows to %s", writer.count, table_name, path)
+    return counts
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import itertools
+from dataclasses import fields, replace
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .asin_structure import _classify_asin
+from .calculator import calc_rate, calc_share, round_float
+from .config import ThresholdConfig
+from .metrics import instrument_stage
+from .parent_summary import SnapshotAggregate
+from .snapshot_frame import np
+
+PROBLEM_CLASSES = (None, "A", "B")
+_THRESHOLD_FIELDS = {item.name for item in fields(ThresholdConfig)}
+
+
+def expand_threshold_grid(grid: Any) -> List[Dict[str, Any]]:
+    """
+    Turn a grid spec into a list of ThresholdConfig overrides.
+
+    ``grid`` is either a list of override dicts, used as-is, or a dict mapping threshold
+    names to lists of values, expanded into their cartesian product.
+    """
+    if isinstance(grid, dict):
+        names = list(grid)
+        values = [item if isinstance(item, list) else [item] for item in grid.values()]
+        scenarios = [dict(zip(names, combo)) for combo in itertools.product(*values)]
+    elif isinstance(grid, list):
+        scenarios = [dict(item) for item in grid]
+    else:
+        raise ValueError("Threshold grid must be a list of overrides or a dict of value lists")
+    for overrides in scenarios:
+        unknown = set(overrides) - _THRESHOLD_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown threshold fields in grid: {', '.join(sorted(unknown))}")
+    return scenarios
+
+
+def _asin_metrics(snapshot: SnapshotAggregate, parent_summary: Dict) -> Tuple[List[str], Dict[str, List[float]]]:
+    # Same inputs build_asin_structure hands to _classify_asin, for every ASIN before the top-N cut.
+    total_units_sold = parent_summary.get("units_sold", 0) or 0
+    total_units_returned = parent_summary.get("units_returned", 0) or 0
+    asins = sorted(snapshot.asin_totals)
+    metrics: Dict[str, List[float]] = {
+        "return_rate": [],
+        "units_returned": [],
+        "sales_share": [],
+        "returns_share": [],
+    }
+    for asin in asins:
+        units_sold = snapshot.asin_totals[asin]["units_sold"]
+        units_returned = snapshot.asin_totals[asin]["units_returned"]
+        metrics["return_rate"].append(calc_rate(units_returned, units_sold))
+        metrics["units_returned"].append(units_returned)
+        metrics["sales_share"].append(calc_share(units_sold, total_units_sold))
+        metrics["returns_share"].append(calc_share(units_returned, total_units_returned))
+    return asins, metrics
+
+
+def _output_order(metrics: Dict[str, List[float]]) -> List[int]:
+    # build_asin_structure's row order: rounded returns_share, then units_returned, ties by ASIN.
+    return sorted(
+        range(len(metrics["returns_share"])),
+        key=lambda idx: (round_float(metrics["returns_share"][idx]), metrics["units_returned"][idx]),
+        reverse=True,
+    )
+
+
+def _output_rows(order: List[int], thresholds: ThresholdConfig) -> set:
+    top_n = thresholds.top_asin_rows
+    return set(order[:top_n] if top_n > 0 else order)
+
+
+def classify_scenarios(
+    metrics: Dict[str, List[float]],
+    scenarios: Sequence[ThresholdConfig],
+    *,
+    parent_return_rate: float,
+) -> Tuple[List[List[int]], List[List[bool]]]:
+    """
+    Classify every ASIN under every threshold set.
+
+    Returns ``(classes, watchlist)`` as scenario x ASIN matrices; classes index into
+    ``PROBLEM_CLASSES``. With NumPy all scenarios are evaluated in one broadcast pass,
+    otherwise ``_classify_asin`` runs per cell.
+    """
+    if np is None:
+        classes: List[List[int]] = []
+        watchlist: List[List[bool]] = []
+        for thresholds in scenarios:
+            row_classes: List[int] = []
+            row_watchlist: List[bool] = []
+            for idx in range(len(metrics["return_rate"])):
+                result = _classify_asin(
+                    return_rate=metrics["return_rate"][idx],
+                    units_returned=metrics["units_returned"][idx],
+                    sales_share=metrics["sales_share"][idx],
+                    returns_share=metrics["returns_share"][idx],
+                    thresholds=thresholds,
+                    parent_return_rate=parent_return_rate,
+                )
+                row_classes.append(PROBLEM_CLASSES.index(result["problem_class"]))
+                row_watchlist.append(bool(result["high_return_watchlist"]))
+            classes.append(row_classes)
+            watchlist.append(row_watchlist)
+        return classes, watchlist
+
+    def column(name: str):
+        return np.array([getattr(item, name) for item in scenarios], dtype=np.float64)[:, None]
+
+    return_rate = np.asarray(metrics["return_rate"], dtype=np.float64)[None, :]
+    units_returned = np.asarray(metrics["units_returned"], dtype=np.float64)[None, :]
+    sales_share = np.asarray(metrics["sales_share"], dtype=np.float64)[None, :]
+    returns_share = np.asarray(metrics["returns_share"], dtype=np.float64)[None, :]
+
+    r_high_b = np.maximum(parent_return_rate, column("warn_return_rate")) + column("high_return_buffer")
+    is_high_return = return_rate >= r_high_b
+    has_volume = units_returned >= column("min_units_returned_b")
+    has_weight = (sales_share > column("min_sales_share_b")) | (returns_share > column("min_returns_share_b"))
+    is_watchlist = is_high_return & has_volume & ~has_weight
+    is_problem_b = is_high_return & has_volume & has_weight
+    is_problem_a = (sales_share >= column("min_sales_share_a")) | (returns_share >= column("min_returns_share_a"))
+    codes = np.where(is_problem_b, 2, np.where(is_problem_a, 1, 0))
+    return codes.tolist(), is_watchlist.tolist()
+
+
+@instrument_stage("threshold_sweep", rows_arg="scenarios")
+def sweep_thresholds(
+    snapshot: SnapshotAggregate,
+    *,
+    parent_summary: Dict,
+    baseline: ThresholdConfig,
+    scenarios: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Classify all ASINs under ``baseline`` and each override set and report the ASINs that flip.
+
+    Counts, baseline classes and flips cover the rows asin_structure would emit under each
+    threshold set, i.e. after its ``top_asin_rows`` cut; ``in_output`` on a flip tells
+    whether the ASIN is emitted under the baseline and under the scenario.
+    """
+    asins, metrics = _asin_metrics(snapshot, parent_summary)
+    order = _output_order(metrics)
+    threshold_sets = [baseline] + [replace(baseline, **overrides) for overrides in scenarios]
+    classes, watchlist = classify_scenarios(
+        metrics,
+        threshold_sets,
+        parent_return_rate=parent_summary.get("return_rate", 0.0) or 0.0,
+    )
+
+    shown = [_output_rows(order, thresholds) for thresholds in threshold_sets]
+
+    def counts(row: int) -> Dict[str, int]:
+        return {
+            "rows": len(shown[row]),
+            "A": sum(1 for idx in shown[row] if classes[row][idx] == 1),
+            "B": sum(1 for idx in shown[row] if classes[row][idx] == 2),
+            "watchlist": sum(1 for idx in shown[row] if watchlist[row][idx]),
+        }
+
+    base_classes, base_watchlist = classes[0], watchlist[0]
+    results: List[Dict[str, Any]] = []
+    for row, overrides in enumerate(scenarios, start=1):
+        flips = [
+            {
+                "asin": asins[idx],
+                "problem_class": [PROBLEM_CLASSES[base_classes[idx]], PROBLEM_CLASSES[classes[row][idx]]],
+                "high_return_watchlist": [bool(base_watchlist[idx]), bool(watchlist[row][idx])],
+                "in_output": [idx in shown[0], idx in shown[row]],
+            }
+            for idx in order
+            if (idx in shown[0] or idx in shown[row])
+            and (
+                (idx in shown[0]) != (idx in shown[row])
+                or classes[row][idx] != base_classes[idx]
+                or watchlist[row][idx] != base_watchlist[idx]
+            )
+        ]
+        results.append({"overrides": overrides, "counts": counts(row), "flips": flips})
+
+    return {
+        "country": snapshot.country,
+        "fasin": snapshot.fasin,
+        "start_date": snapshot.start_date,
+        "end_date": snapshot.end_date,
+        "asin_count": len(asins),
+        "top_asin_rows": baseline.top_asin_rows,
+        "baseline": {
+            "counts": counts(0),
+            "classes": {
+                asins[idx]: {
+                    "problem_class": PROBLEM_CLASSES[base_classes[idx]],
+                    "high_return_watchlist": bool(base_watchlist[idx]),
+                }
+                for idx in order
+                if idx in shown[0]
+            },
+        },
+        "scenarios": results,
+    }